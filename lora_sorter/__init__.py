@@ -0,0 +1,4 @@
+# ------------------------------
+# LoRA Sorter – shared helpers
+# Used by lora_sorter_gui_enhanced_v15.py. Nothing in here imports tkinter.
+# ------------------------------
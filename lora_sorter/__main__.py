@@ -0,0 +1,5 @@
+import sys
+
+from lora_sorter.cli import main
+
+sys.exit(main())
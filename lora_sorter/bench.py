@@ -0,0 +1,215 @@
+# ------------------------------
+# Benchmarks: python -m lora_sorter.bench --scales 1000,10000 --out results.json
+# Builds synthetic LoRA libraries and times the headless engine operations behind
+# Preview, Orphan Finder, Duplicate Detector, Move Files and Undo at each scale.
+# Results are JSON; --compare old.json flags operations that got slower.
+# ------------------------------
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from lora_sorter.engine import NullContext, SorterEngine
+from lora_sorter.walk import DEFAULT_WORKERS
+
+DEFAULT_SCALES = "1000,10000"
+DEFAULT_EXTS = ".safetensors,.civitai.info,.preview.png,.json,.html"
+OPERATIONS = ("index_cold", "index_cached", "preview", "orphans", "duplicates", "move", "undo")
+REGRESSION_THRESHOLD = 1.10  # --compare: slower than this ratio counts as a regression
+
+
+# ---- synthetic library ----
+def make_library(root, models, depth=2, fanout=8, completeness=0.8, exts=DEFAULT_EXTS.split(","),
+                 refs=0.1, duplicates=0.02, seed=0):
+    # Writes a base folder under root and returns the reference files (in the base folder itself):
+    # - every model lives in one leaf folder, depth levels down with fanout folders per level,
+    #   with each extension present at probability completeness (the first one always)
+    # - a refs fraction of models also has a copy of its first extension in the base folder,
+    #   the files Preview/Move/Orphan Finder work on
+    # - a duplicates fraction of models has a second, partial sibling set in another folder
+    rnd = random.Random(seed)
+    leaves = [""]
+    for level in range(depth):
+        leaves = [os.path.join(p, f"cat{level}_{i}") for p in leaves for i in range(fanout)]
+    for leaf in leaves:
+        os.makedirs(os.path.join(root, leaf), exist_ok=True)
+
+    ref_files = []
+    for m in range(models):
+        base = f"Model_{m:07d}_v{rnd.randint(1, 9)}"
+        folder = os.path.join(root, rnd.choice(leaves))
+        for i, ext in enumerate(exts):
+            if i == 0 or rnd.random() < completeness:
+                _touch(os.path.join(folder, base + ext))
+        if rnd.random() < duplicates:
+            other = os.path.join(root, rnd.choice(leaves))
+            _touch(os.path.join(other, base + exts[-1]))
+        if rnd.random() < refs:
+            ref = os.path.join(root, base + exts[0])
+            _touch(ref)
+            ref_files.append(ref)
+    return ref_files
+
+
+def _touch(path):
+    with open(path, "wb") as f:
+        f.write(b"\0" * 16)
+
+
+def count_files(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+# ---- timing ----
+def time_ops(base, refs, exts, repeat=3, workers=DEFAULT_WORKERS):
+    # {operation: [seconds per run]}; every move run is undone again so each repeat starts
+    # from the same tree
+    ctx = NullContext()
+    exts = set(exts)
+    times = {op: [] for op in OPERATIONS}
+
+    def timed(op, fn):
+        start = time.perf_counter()
+        result = fn()
+        times[op].append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        timed("index_cold", lambda: SorterEngine(workers=workers, use_cache=False).ensure_index(ctx, base))
+
+    engine = SorterEngine(workers=workers, use_cache=True)
+    engine.ensure_index(ctx, base, refresh=True)  # fills the persistent store
+    for _ in range(repeat):
+        timed("index_cached", lambda: engine.ensure_index(ctx, base, refresh=True))
+        results = timed("preview", lambda: [(r, s) for r, s in engine.iter_preview(ctx, base, refs) if s])
+        timed("orphans", lambda: list(engine.iter_orphans(ctx, base, exts)))
+        timed("duplicates", lambda: list(engine.iter_duplicates(ctx, base)))
+        batch = timed("move", lambda: engine.move_preview(ctx, results, "rename"))
+        timed("undo", lambda: engine.replay_batch(ctx, batch, "rename", "undo", "Restored"))
+    return times
+
+
+def summarize(scale, files, times):
+    rows = []
+    for op in OPERATIONS:
+        runs = times[op]
+        if not runs:
+            continue
+        rows.append({
+            "scale": scale,
+            "files": files,
+            "operation": op,
+            "runs": [round(t, 6) for t in runs],
+            "best": round(min(runs), 6),
+            "median": round(statistics.median(runs), 6),
+            "us_per_file": round(min(runs) / max(files, 1) * 1e6, 3),
+        })
+    return rows
+
+
+def environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": rev or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    # Prints best-time ratios against an earlier results file; returns the regressions
+    with open(baseline_path, encoding="utf-8") as f:
+        old = {(r["scale"], r["operation"]): r for r in json.load(f)["results"]}
+    slower = []
+    for r in results:
+        prev = old.get((r["scale"], r["operation"]))
+        if prev is None or not prev["best"]:
+            continue
+        ratio = r["best"] / prev["best"]
+        flag = "  SLOWER" if ratio > threshold else ""
+        print(f"{r['operation']:>13} @ {r['scale']:>7}: {prev['best']:.4f}s -> {r['best']:.4f}s ({ratio:.2f}x){flag}",
+              file=sys.stderr)
+        if ratio > threshold:
+            slower.append(r)
+    return slower
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m lora_sorter.bench", description="LoRA Sorter benchmarks")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma-separated model counts")
+    parser.add_argument("--depth", type=int, default=2, help="folder levels below the base folder")
+    parser.add_argument("--fanout", type=int, default=8, help="subfolders per level")
+    parser.add_argument("--completeness", type=float, default=0.8,
+                        help="chance each extension of a sibling set exists (0-1)")
+    parser.add_argument("--exts", default=DEFAULT_EXTS, help="extension mix, first one is the model file")
+    parser.add_argument("--refs", type=float, default=0.1, help="fraction of models with a file in the base folder")
+    parser.add_argument("--duplicates", type=float, default=0.02, help="fraction of models in two folders")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel scan threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", help="where to build the libraries (default: a temp folder, removed afterwards)")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="compare with earlier results, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="best-time ratio above which --compare reports a regression")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    exts = [e.strip() for e in args.exts.split(",") if e.strip()]
+    work = args.dir or tempfile.mkdtemp(prefix="lora_bench_")
+    os.makedirs(work, exist_ok=True)
+    # Keep the persistent index store away from the user's real cache
+    cache = os.path.join(work, "cache")
+    os.environ["XDG_CACHE_HOME"] = cache
+    os.environ["LOCALAPPDATA"] = cache
+
+    results = []
+    try:
+        for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+            base = os.path.join(work, f"library_{scale}")
+            shutil.rmtree(base, ignore_errors=True)
+            print(f"Building library with {scale} models…", file=sys.stderr)
+            refs = make_library(base, scale, args.depth, args.fanout, args.completeness, exts,
+                                args.refs, args.duplicates, args.seed)
+            files = count_files(base)
+            times = time_ops(base, refs, exts, max(1, args.repeat), max(1, args.workers))
+            rows = summarize(scale, files, times)
+            for r in rows:
+                print(f"{r['operation']:>13} @ {scale:>7} models / {files:>8} files: "
+                      f"best {r['best']:.4f}s, median {r['median']:.4f}s", file=sys.stderr)
+            results.extend(rows)
+            if not args.dir:
+                shutil.rmtree(base, ignore_errors=True)
+    finally:
+        if not args.dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {"environment": environment(), "params": vars(args), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
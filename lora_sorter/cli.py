@@ -0,0 +1,327 @@
+# ------------------------------
+# Headless LoRA Sorter: python -m lora_sorter <command> --base FOLDER ...
+# Results are streamed to stdout as JSON lines, human-readable log lines go to stderr.
+# Never imports tkinter, so it starts fast and runs over SSH / from cron.
+# ------------------------------
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+
+from lora_sorter.engine import CONFLICT_MODES, DEFAULT_EXTENSIONS, ROUTES, SorterEngine, parse_extensions
+from lora_sorter.hashing import DEFAULT_HASH_WORKERS
+from lora_sorter.index import find_orphans
+from lora_sorter.keys import DOT_RULES, KEY_STEPS, parse_key_rule
+from lora_sorter.logsink import LEVELS, OFF, DebugLog
+from lora_sorter.metrics import Metrics, write_metrics
+from lora_sorter.moves import DEFAULT_PER_DEVICE
+from lora_sorter.plan import MovePlan
+from lora_sorter.safetensors_header import DEFAULT_HEADER_WORKERS, FIELDS, sort_key
+from lora_sorter.sidecars import DEFAULT_SIDECAR_WORKERS
+from lora_sorter.walk import DEFAULT_WORKERS
+from lora_sorter.watch import POLL_INTERVAL, make_watcher
+
+
+class StderrSink:
+    def write(self, text):
+        print(text, file=sys.stderr)
+
+
+class JsonlContext:
+    # Same interface as worker.TaskContext; Ctrl+C asks for a clean stop between files
+    def __init__(self, out=sys.stdout, quiet=False):
+        self.out = out
+        self.quiet = quiet
+        self.cancelled = False
+
+    def log(self, text):
+        if not self.quiet:
+            print(text, file=sys.stderr)
+
+    def debug(self, text):
+        self.log(text)
+
+    def status(self, text):
+        self.log(text)
+
+    def record(self, kind, **data):
+        data = {"event": kind, **data}
+        self.out.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def check(self):
+        if self.cancelled:
+            raise KeyboardInterrupt
+
+    def cancel(self, *_):
+        if self.cancelled:
+            raise KeyboardInterrupt
+        self.cancelled = True
+        self.log("Cancelling after the current file… (Ctrl+C again to abort)")
+
+
+def read_refs(args):
+    # Reference files as absolute paths, so "moved" records (and undo) work from any directory
+    refs = list(args.refs)
+    if args.refs_from:
+        f = sys.stdin if args.refs_from == "-" else open(args.refs_from, encoding="utf-8")
+        with f:
+            refs.extend(line.rstrip("\n") for line in f if line.strip())
+    return [os.path.abspath(ref) for ref in refs]
+
+
+def read_moves(path):
+    # "moved" records from an earlier run's output, as (current, original) pairs
+    batch = []  # plain list; replay_batch only needs indexing and len()
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if rec.get("event") == "moved":
+                batch.append((rec["dest"], rec["src"]))
+    return batch
+
+
+def write_plan(ctx, plan, path):
+    for entry in plan.entries:
+        ctx.record("planned", src=entry.src, dest=entry.dest, action=entry.action)
+    plan.save(path)
+    ctx.log(f"Plan with {len(plan)} move(s) written to {path}")
+
+
+def watch_base(ctx, engine, args, exts):
+    # Subscribe before indexing so changes made meanwhile are queued, then apply changes
+    # as they come in until Ctrl+C
+    watcher = make_watcher(args.base, args.poll or POLL_INTERVAL, polling=bool(args.poll))
+    watcher.start()
+    try:
+        index = engine.ensure_index(ctx, args.base)
+        ctx.log(f"Watching {', '.join(index.roots)} for changes ({watcher.kind}), Ctrl+C to stop.")
+        while not ctx.cancelled:
+            time.sleep(0.5)
+            events = watcher.drain()
+            if not events:
+                continue
+            for kind, path in events:
+                if kind == "error":
+                    ctx.log(f"Watch stopped: {path}")
+                    return
+            touched = engine.apply_changes(events)
+            if touched is None:
+                ctx.record("rescan")
+                index = engine.ensure_index(ctx, args.base)
+                continue
+            for kind, path in events:
+                ctx.record({"add": "added", "remove": "removed", "remove_tree": "removed_tree"}[kind], path=path)
+                if kind == "add" and os.path.dirname(os.path.abspath(path)) in index.roots:
+                    for sib in index.siblings(path):
+                        ctx.record("sibling", ref=path, path=sib)
+            if exts:
+                orphaned = set()
+                for base, missing, orphans, siblings in find_orphans(index, exts, ctx.check, touched):
+                    orphaned.add(base)
+                    ctx.record("orphan", base=base, missing=sorted(missing), orphans=orphans, siblings=siblings)
+                for base in sorted(touched - orphaned):
+                    if any(base in index.dirs.get(root, {}) for root in index.roots):
+                        ctx.record("not_orphan", base=base)
+    finally:
+        watcher.stop()
+
+
+HEADER_FIELDS = tuple(f for f, _ in FIELDS) + ("tensors",)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m lora_sorter", description="Headless LoRA Sorter")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--base", action="append",
+                        help="base folder whose subfolders are searched; repeat to search several at once")
+    common.add_argument("--ext", default=DEFAULT_EXTENSIONS, help="comma-separated extensions list")
+    common.add_argument("--conflict", choices=CONFLICT_MODES, default="skip", help="what to do when the target exists")
+    common.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel scan threads")
+    common.add_argument("--move-workers", type=int, default=DEFAULT_PER_DEVICE,
+                        help="parallel copies per destination drive for cross-drive moves")
+    common.add_argument("--no-cache", action="store_true", help="scan without the persistent index")
+    common.add_argument("--match", default="", metavar="STEPS",
+                        help=f"looser sibling matching, comma-separated: {', '.join(KEY_STEPS)}")
+    common.add_argument("--dots", choices=DOT_RULES, default="first",
+                        help="where the base name ends: first dot, last dot, or before a known extension")
+    common.add_argument("--log-level", choices=list(LEVELS), default="off", help="debug output on stderr")
+    common.add_argument("-q", "--quiet", action="store_true", help="no log lines on stderr")
+    common.add_argument("--metrics", metavar="FILE", help="write phase timings and counters as JSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    refs = argparse.ArgumentParser(add_help=False)
+    refs.add_argument("refs", nargs="*", help="reference files")
+    refs.add_argument("--refs-from", help="file with one reference path per line ('-' for stdin)")
+    refs.add_argument("--loose", action="store_true",
+                      help="use every file directly in the base folder(s) as a reference")
+    refs.add_argument("--route", choices=ROUTES, default="name",
+                      help="find target folders by sibling name, by Civitai model ID from .civitai.info/.json "
+                           "files, or into the folder holding most files with the same safetensors header field")
+
+    plan = argparse.ArgumentParser(add_help=False)
+    plan.add_argument("--plan", metavar="FILE", help="write a move plan to FILE instead of moving (see run-plan)")
+
+    sub.add_parser("preview", parents=[common, refs], help="list sibling matches for reference files")
+    sub.add_parser("move", parents=[common, refs, plan],
+                   help="preview, then move each reference file next to its siblings")
+    sub.add_parser("orphans", parents=[common], help="list files in the base folder missing some extensions")
+    sub.add_parser("move-orphans", parents=[common, plan], help="move orphans into their siblings' folder")
+    dups = sub.add_parser("duplicates", parents=[common], help="list base names found in more than one folder")
+    dups.add_argument("--content", action="store_true",
+                      help="list files with identical content instead (matching --ext, any name)")
+    dups.add_argument("--hash-workers", type=int, default=DEFAULT_HASH_WORKERS, help="parallel file readers")
+    info = sub.add_parser("info", parents=[common], help="list .safetensors files with fields from their headers")
+    info.add_argument("--sort", default="", metavar="FIELDS",
+                      help=f"comma-separated sort fields: {', '.join(HEADER_FIELDS)}, path")
+    info.add_argument("--header-workers", type=int, default=DEFAULT_HEADER_WORKERS, help="parallel header readers")
+    meta = sub.add_parser("sidecars", parents=[common],
+                          help="list models found in .civitai.info/.json files, with the files of each")
+    meta.add_argument("--model", type=int, help="only this Civitai model ID")
+    meta.add_argument("--tag", help="only models with this tag")
+    meta.add_argument("--type", help="only models of this type (e.g. LORA, LoCon)")
+    meta.add_argument("--sidecar-workers", type=int, default=DEFAULT_SIDECAR_WORKERS, help="parallel parser processes")
+    watch = sub.add_parser("watch", parents=[common],
+                           help="keep the index current and report siblings/orphan status of new files until Ctrl+C")
+    watch.add_argument("--poll", type=float, metavar="SECONDS",
+                       help=f"poll folder mtimes instead of using inotify (default interval {POLL_INTERVAL:g}s)")
+    undo = sub.add_parser("undo", parents=[common], help="reverse the 'moved' records of an earlier run")
+    undo.add_argument("moves", help="JSONL output of an earlier move/move-orphans run ('-' for stdin)")
+    run_plan = sub.add_parser("run-plan", parents=[common], help="check a saved move plan against the disk and run it")
+    run_plan.add_argument("plan_file", metavar="PLAN", help="plan written by move/move-orphans --plan")
+    run_plan.add_argument("--check", action="store_true", help="only report moves that can no longer run as planned")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command not in ("undo", "run-plan") and not args.base:
+        print("error: --base is required", file=sys.stderr)
+        return 2
+
+    ctx = JsonlContext(quiet=args.quiet)
+    dlog = DebugLog(StderrSink(), LEVELS[args.log_level] if not args.quiet else OFF)
+    try:
+        keys = parse_key_rule(args.match, args.dots)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    engine = SorterEngine(workers=max(1, args.workers), use_cache=not args.no_cache, dlog=dlog,
+                          move_workers=max(1, args.move_workers), keys=keys)
+    engine.metrics = Metrics(args.command)
+    signal.signal(signal.SIGINT, ctx.cancel)
+    exts = parse_extensions(args.ext)
+
+    try:
+        if args.command in ("preview", "move"):
+            if args.loose:
+                matches = engine.iter_loose(ctx, args.base, args.route)
+            else:
+                refs = read_refs(args)
+                if not refs:
+                    print("error: no reference files given", file=sys.stderr)
+                    return 2
+                matches = engine.iter_preview(ctx, args.base, refs, args.route)
+            results = []
+            for ref_file, siblings in matches:
+                if siblings:
+                    for sib in siblings:
+                        ctx.record("sibling", ref=ref_file, path=sib)
+                else:
+                    ctx.record("no_siblings", ref=ref_file)
+                if args.command == "move" and siblings:
+                    results.append((ref_file, siblings))
+            if args.command == "move" and args.plan:
+                write_plan(ctx, engine.compile_plan(ctx, "preview", results, args.conflict, args.base), args.plan)
+            elif args.command == "move":
+                engine.move_preview(ctx, results, args.conflict)
+
+        elif args.command in ("orphans", "move-orphans"):
+            if not exts:
+                print("error: orphan search needs an extensions list", file=sys.stderr)
+                return 2
+            orphan_items = []
+            for base, missing, orphans, siblings in engine.iter_orphans(ctx, args.base, exts):
+                ctx.record("orphan", base=base, missing=sorted(missing), orphans=orphans, siblings=siblings)
+                if args.command == "move-orphans":
+                    orphan_items.append((base, {'orphan': orphans, 'siblings': siblings}))
+            if args.command == "move-orphans" and args.plan:
+                write_plan(ctx, engine.compile_plan(ctx, "orphans", orphan_items, args.conflict, args.base), args.plan)
+            elif args.command == "move-orphans":
+                engine.move_orphans(ctx, orphan_items, args.conflict)
+
+        elif args.command == "duplicates" and args.content:
+            engine.hash_workers = max(1, args.hash_workers)
+            for digest, size, paths in engine.find_identical(ctx, args.base, exts):
+                ctx.record("identical", sha256=digest, size=size, paths=paths)
+
+        elif args.command == "duplicates":
+            for base, folders in engine.iter_duplicates(ctx, args.base):
+                ctx.record("duplicate", base=base, folders=folders)
+
+        elif args.command == "info":
+            order = [f.strip() for f in args.sort.split(",") if f.strip()]
+            unknown = [f for f in order if f not in HEADER_FIELDS + ("path",)]
+            if unknown:
+                print(f"error: unknown sort field(s): {', '.join(unknown)}", file=sys.stderr)
+                return 2
+            engine.header_workers = max(1, args.header_workers)
+            files = list(engine.iter_headers(ctx, args.base))
+            files.sort(key=lambda pf: [pf[0].lower() if f == "path" else sort_key(pf[1], f) for f in order + ["path"]])
+            for path, fields in files:
+                ctx.record("header", path=path, **fields)
+
+        elif args.command == "sidecars":
+            engine.sidecar_workers = max(1, args.sidecar_workers)
+            sidecars = engine.sidecar_index(ctx, args.base)
+            groups = set(sidecars.groups)
+            for field, value in (("model", args.model), ("tag", args.tag), ("type", args.type)):
+                if value is not None:
+                    wanted = {"model": sidecars.by_model, "tag": sidecars.by_tag, "type": sidecars.by_type}[field]
+                    groups &= wanted.get(value if field == "model" else value.lower(), set())
+            for folder, key in sorted(groups):
+                ctx.record("sidecar", folder=folder, key=key, **sidecars.groups[(folder, key)],
+                           files=sidecars.files([(folder, key)]))
+
+        elif args.command == "watch":
+            watch_base(ctx, engine, args, exts)
+
+        elif args.command == "run-plan":
+            plan = MovePlan.load(args.plan_file)
+            if args.check:
+                problems = engine.check_plan(ctx, plan)
+                ctx.log(f"{problems.count(None)} of {len(plan)} move(s) can run as planned.")
+            else:
+                engine.execute_plan(ctx, plan)
+
+        elif args.command == "undo":
+            _, pending = engine.replay_batch(ctx, read_moves(args.moves), args.conflict, "undo", "Restored")
+            for current, original in pending:
+                ctx.record("pending", src=current, dest=original)
+    except KeyboardInterrupt:
+        engine.metrics.outcome = "Cancelled"
+        ctx.log("Cancelled.")
+        return 130
+    except BrokenPipeError:
+        return 0
+    finally:
+        try:
+            sys.stdout.flush()
+        except BrokenPipeError:
+            pass
+        finish_metrics(ctx, engine.metrics, args.metrics)
+    return 130 if ctx.cancelled else 0
+
+
+def finish_metrics(ctx, metrics, path):
+    metrics.finish()
+    if metrics.outcome is None:
+        metrics.outcome = "Cancelled" if ctx.cancelled else "Done"
+    ctx.log(f"Metrics: {metrics.summary()}")
+    if path:
+        write_metrics(path, [metrics])
@@ -0,0 +1,620 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lora_sorter.extensions import ExtensionMatcher
+from lora_sorter.hashing import DEFAULT_HASH_WORKERS, DuplicateFinder
+from lora_sorter.index import ScanIndex, base_roots, find_orphans
+from lora_sorter.keys import EXACT
+from lora_sorter.journal import Batch, DirTable
+from lora_sorter.logsink import DEBUG, OFF, TRACE, DebugLog
+from lora_sorter.metrics import Metrics
+from lora_sorter.moves import CANCELLED, DEFAULT_PER_DEVICE, MoveExecutor, MoveOp, NameCache
+from lora_sorter.plan import MovePlan
+from lora_sorter.safetensors_header import (DEFAULT_HEADER_WORKERS, HEADER_ROUTES, SAFETENSORS_EXT, HeaderReader,
+                                            HeaderRouter)
+from lora_sorter.sidecars import DEFAULT_SIDECAR_WORKERS, SidecarIndex, SidecarReader, is_sidecar
+from lora_sorter.store import FileCache, IndexStore
+from lora_sorter.walk import DEFAULT_WORKERS
+
+DEFAULT_EXTENSIONS = ".html,.civitai.info,.json,.preview.png,.safetensors"
+CONFLICT_MODES = ("skip", "overwrite", "rename")
+# How iter_preview / iter_loose find target folders: by sibling key (name), by Civitai model
+# ID from sidecars, or by a safetensors header field
+ROUTES = ("name", "model") + HEADER_ROUTES
+
+
+def parse_extensions(raw):
+    raw = (raw or "").strip()
+    if not raw:
+        return None  # None means move all related files regardless of extension
+    parts = [p.strip() for p in raw.split(',') if p.strip()]
+    exts = set()
+    for p in parts:
+        if p.startswith('.') or p.startswith('*'):
+            exts.add(p)
+        else:
+            exts.add('.' + p)
+    return exts
+
+
+class NullContext:
+    # Stand-in for worker.TaskContext when the engine is driven directly
+    cancelled = False
+
+    def log(self, text):
+        pass
+
+    def debug(self, text):
+        pass
+
+    def status(self, text):
+        pass
+
+    def record(self, kind, **data):
+        pass
+
+    def check(self):
+        pass
+
+
+class SorterEngine:
+    # Preview / move / orphan / duplicate / undo logic without any GUI state.
+    # Every operation takes a ctx (worker.TaskContext, cli.JsonlContext or NullContext):
+    # ctx.log() gets human-readable lines, ctx.record() gets the same facts as structured
+    # records, and ctx.check()/ctx.cancelled stop a run between files.
+    def __init__(self, workers=DEFAULT_WORKERS, use_cache=True, dlog=None, move_workers=DEFAULT_PER_DEVICE,
+                 journal=None, hash_workers=DEFAULT_HASH_WORKERS, keys=EXACT,
+                 sidecar_workers=DEFAULT_SIDECAR_WORKERS, header_workers=DEFAULT_HEADER_WORKERS):
+        self.workers = workers
+        self.keys = keys  # keys.KeyRule siblings are matched by; the index is rebuilt when it changes
+        self.hash_workers = hash_workers
+        self.sidecar_workers = sidecar_workers
+        self.header_workers = header_workers
+        self.executor = MoveExecutor(per_device=move_workers)
+        self.use_cache = use_cache
+        self.dlog = dlog if dlog is not None else DebugLog(None, OFF)
+        self.index = None
+        self.index_stale = False  # set before a task to re-check the disk on its next ensure_index
+        self.journal = journal  # optional Journal: makes history survive restarts and crashes
+        self._dirs = DirTable()
+        self.history = []     # list of Batch, each a sequence of (current_path, original_path)
+        self.redo_stack = []
+        # Timers/counters of the running operation; callers swap in a fresh Metrics per task
+        self.metrics = Metrics()
+
+    # ------------------------------ Index ------------------------------
+    def ensure_index(self, ctx, base_dir, refresh=False):
+        # Load the base folder index once and reuse it until the base folder changes or a task
+        # sets index_stale.
+        # base_dir may also be a list of base folders (see index.base_roots).
+        # The persistent store only re-lists folders whose mtime changed since the last run,
+        # so a refresh per task (index_stale) is cheap and picks up files added meanwhile.
+        roots = base_roots(base_dir)
+        if (refresh or self.index_stale or self.index is None or self.index.roots != roots
+                or self.index.keys != self.keys):
+            self.index_stale = False
+            ctx.status("Indexing base folder…" if len(roots) == 1 else f"Indexing {len(roots)} base folders…")
+            trace = self.dlog.trace if self.dlog.enabled(TRACE) else None
+            m = self.metrics
+            if self.use_cache:
+                # One store per root, refreshed side by side (one thread per root, each with its
+                # own scan pool), then loaded into a single index
+                stores = [IndexStore(root, workers=self.workers) for root in roots]
+                with m.phase("scan"):
+                    if len(stores) == 1:
+                        stores[0].refresh(check=ctx.check, trace=trace)
+                    else:
+                        with ThreadPoolExecutor(max_workers=len(stores), thread_name_prefix="root") as pool:
+                            for f in [pool.submit(st.refresh, ctx.check, trace) for st in stores]:
+                                f.result()
+                index = ScanIndex(roots, self.keys)
+                with m.phase("load index"):
+                    for store in stores:
+                        store.load_index(trace=trace, index=index)
+                self.index = index
+                for store in stores:
+                    self.dlog.info("[DEBUG] Index refresh of %s: %d folders re-listed, %d unchanged",
+                                   store.root, store.dirs_listed, store.dirs_reused)
+                    m.count("dirs_listed", store.dirs_listed)
+                    m.count("dirs_unchanged", store.dirs_reused)
+                    m.count("entries_seen", store.entries_seen)
+                    m.count("stat_calls", store.stat_calls)
+            else:
+                with m.phase("scan"):
+                    self.index = ScanIndex(roots, self.keys).build(workers=self.workers, check=ctx.check)
+                m.count("dirs_listed", self.index.dirs_listed)
+                m.count("entries_seen", self.index.file_count)
+            self.dlog.info("[DEBUG] Indexed %d files in %d folders under %s",
+                           self.index.file_count, len(self.index.dirs), ", ".join(self.index.roots))
+        return self.index
+
+    def drop_index(self):
+        self.index = None
+
+    def index_moved(self, src, dest):
+        if self.index is not None:
+            self.index.move_file(src, dest)
+
+    def apply_changes(self, events):
+        # Applies watch.Watcher events to the loaded index and returns the base names they
+        # touched, or None when the index had to be dropped (lost events) and needs a rescan.
+        # Events for the engine's own moves arrive too; they are no-ops by then.
+        index = self.index
+        if index is None:
+            return set()
+        touched = set()
+        for kind, path in events:
+            if kind == "rescan":
+                self.drop_index()
+                return None
+            if kind == "add":
+                index.add_file(path)
+            elif kind == "remove":
+                index.remove_file(path)
+            elif kind == "remove_tree":
+                touched |= index.remove_tree(path)
+                continue
+            else:
+                continue
+            touched.add(index.key(os.path.basename(path)))
+        self.dlog.info("[DEBUG] Watch: applied %d change(s), %d base name(s) touched", len(events), len(touched))
+        return touched
+
+    def sidecar_index(self, ctx, base_dir):
+        # Civitai/metadata sidecars of the indexed files, parsed (or taken from the cache) and
+        # grouped by sibling set; see sidecars.SidecarIndex
+        index = self.ensure_index(ctx, base_dir)
+        ctx.status("Reading metadata files…")
+        paths = [p for p in index.iter_files() if is_sidecar(p)]
+        reader = SidecarReader(self.sidecar_workers, FileCache("sidecars") if self.use_cache else None)
+        with self.metrics.phase("sidecars"):
+            sidecars = SidecarIndex(index, reader.read(paths, check=ctx.check))
+        self.metrics.count("sidecars_parsed", reader.parsed)
+        self.metrics.count("sidecar_cache_hits", reader.cache_hits)
+        self.dlog.info("[DEBUG] Sidecars: %d files, %d parsed, %d from cache, %d models",
+                       len(paths), reader.parsed, reader.cache_hits, len(sidecars.by_model))
+        return sidecars
+
+    def header_router(self, ctx, base_dir, field, refs=()):
+        # safetensors_header.HeaderRouter over the indexed .safetensors files plus refs
+        index = self.ensure_index(ctx, base_dir)
+        paths = {p for p in index.iter_files() if p.lower().endswith(SAFETENSORS_EXT)}
+        paths.update(os.path.abspath(r) for r in refs)
+        headers = self.read_headers(ctx, sorted(paths))
+        with self.metrics.phase("route"):
+            return HeaderRouter(index, headers, field)
+
+    def _router(self, ctx, base_dir, route, refs=()):
+        # Something with siblings(ref_file) and loose_siblings(check) for a route
+        if route == "name":
+            return self.ensure_index(ctx, base_dir)
+        if route == "model":
+            return self.sidecar_index(ctx, base_dir)
+        if route in HEADER_ROUTES:
+            return self.header_router(ctx, base_dir, route, refs)
+        raise ValueError(f"unknown route {route!r} (use one of {', '.join(ROUTES)})")
+
+    # ------------------------------ Scans ------------------------------
+    def iter_preview(self, ctx, base_dir, refs, route="name"):
+        # Yields (ref_file, [sibling paths]) per reference, in order. route (see ROUTES) picks
+        # how the targets are found; "name" is the usual sibling match.
+        siblings = self._router(ctx, base_dir, route, refs).siblings
+        ctx.status("Scanning subfolders…")
+        verbose = self.dlog.enabled(DEBUG)
+        m = self.metrics
+        for ref_file in refs:
+            ctx.check()
+            start = time.perf_counter()
+            sibling_files = siblings(ref_file)
+            m.add_time("match", time.perf_counter() - start)
+            m.count("refs_matched")
+            m.count("siblings_found", len(sibling_files))
+            if verbose:
+                self.dlog.debug("[DEBUG] Reference file: %s", ref_file)
+                for sib in sibling_files:
+                    self.dlog.debug("[DEBUG] Sibling match: %s", sib)
+            yield ref_file, sibling_files
+
+    def iter_loose(self, ctx, base_dir, route="name"):
+        # Bulk preview: every file directly in the base folder(s) is a reference. Yields
+        # (ref_file, [sibling paths]) for the ones with siblings, from one join of the
+        # top-level names against the index instead of a lookup per chosen file.
+        index = self.ensure_index(ctx, base_dir)
+        source = self._router(ctx, base_dir, route)
+        ctx.status("Matching loose files…")
+        m = self.metrics
+        verbose = self.dlog.enabled(DEBUG)
+        for ref_file, sibling_files in self._timed("match", source.loose_siblings(ctx.check)):
+            m.count("refs_matched")
+            m.count("siblings_found", len(sibling_files))
+            if verbose:
+                self.dlog.debug("[DEBUG] Loose file: %s (%d siblings)", ref_file, len(sibling_files))
+            yield ref_file, sibling_files
+        m.count("loose_unmatched", index.loose_unmatched)
+
+    def iter_orphans(self, ctx, base_dir, exts, bases=None):
+        # Yields (base, missing_exts, orphan_files, sibling_files); bases limits the check
+        index = self.ensure_index(ctx, base_dir)
+        ctx.status("Scanning for orphans…")
+        return self._timed("match", find_orphans(index, exts, check=ctx.check, bases=bases))
+
+    def iter_duplicates(self, ctx, base_dir):
+        # Yields (base, [folders]) for base names present in more than one folder
+        index = self.ensure_index(ctx, base_dir)
+        ctx.status("Scanning for duplicates…")
+        yield from self._timed("match", self._duplicates(ctx, index))
+
+    def _duplicates(self, ctx, index):
+        for base, dirs in list(index.by_base.items()):
+            if len(dirs) > 1:
+                ctx.check()
+                yield base, sorted(dirs)
+
+    def _timed(self, phase, items):
+        # Passes a generator through, adding only the time spent inside it to phase
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                self.metrics.add_time(phase, time.perf_counter() - start)
+                return
+            self.metrics.add_time(phase, time.perf_counter() - start)
+            yield item
+
+    def find_identical(self, ctx, base_dir, exts=None):
+        # Returns [(sha256, size, [paths])] for files with the same content, whatever their
+        # names; exts limits which files are compared (None = all). Hashes are cached
+        # between runs unless use_cache is off.
+        index = self.ensure_index(ctx, base_dir)
+        matcher = ExtensionMatcher(exts)
+        paths = [p for p in index.iter_files() if matcher.matches(os.path.basename(p))]
+        finder = DuplicateFinder(self.hash_workers, FileCache("hashes") if self.use_cache else None)
+        groups = finder.run(paths, check=ctx.check, status=ctx.status)
+        for phase, seconds in finder.phase_times.items():
+            self.metrics.add_time(phase, seconds)
+        self.metrics.count("files_compared", len(paths))
+        self.metrics.count("files_hashed", finder.files_hashed)
+        self.metrics.count("hash_cache_hits", finder.cache_hits)
+        self.metrics.count("bytes_hashed", finder.bytes_read)
+        self.dlog.info("[DEBUG] Content scan: %d files compared, %d hashed, %d from cache, %.1f MB read",
+                       len(paths), finder.files_hashed, finder.cache_hits, finder.bytes_read / 1e6)
+        return groups
+
+    def read_headers(self, ctx, paths):
+        # {path: header fields} for the .safetensors files among paths (see safetensors_header);
+        # only the JSON header at the start of each file is read, and parsed fields are cached
+        # between runs unless use_cache is off
+        ctx.status("Reading safetensors headers…")
+        reader = HeaderReader(self.header_workers, FileCache("headers") if self.use_cache else None)
+        with self.metrics.phase("headers"):
+            fields = reader.read(paths, check=ctx.check)
+        self.metrics.count("headers_read", reader.headers_read)
+        self.metrics.count("header_cache_hits", reader.cache_hits)
+        self.dlog.info("[DEBUG] Headers: %d read, %d from cache, %.1f KB read",
+                       reader.headers_read, reader.cache_hits, reader.bytes_read / 1e3)
+        return fields
+
+    def iter_headers(self, ctx, base_dir):
+        # Yields (path, fields) for every .safetensors file under the base folder(s)
+        index = self.ensure_index(ctx, base_dir)
+        paths = [p for p in index.iter_files() if p.lower().endswith(SAFETENSORS_EXT)]
+        fields = self.read_headers(ctx, paths)
+        for path in paths:
+            if path in fields:
+                yield path, fields[path]
+
+    # ------------------------------ Moves ------------------------------
+    def resolve_conflict(self, dest_path, mode, names):
+        # names: the batch's NameCache, which already reflects the moves planned so far.
+        # Overwrites happen atomically when the move runs (os.replace), not here.
+        if mode == "overwrite":
+            return dest_path
+        elif mode == "rename":
+            return names.unique(dest_path)
+        else:  # skip
+            return None
+
+    def _execute(self, ctx, ops, kind="move", source=None, verb="moving", locality=False):
+        # Runs planned MoveOps (payload = sequence number) through the executor and returns
+        # the ones that landed in order, the ones that didn't (cancelled before they started,
+        # or failed), and the journal batch id. With a journal, every intent is on disk before the first move
+        # and every completion right after it lands.
+        m = self.metrics
+        batch_id = None
+        if self.journal is not None and ops:
+            with m.phase("journal"):
+                batch_id = self.journal.begin(kind, source)
+                self.journal.intents(batch_id, [(op.payload, op.src, op.dest) for op in ops])
+        done, left = [], []
+        start = time.perf_counter()
+        try:
+            for op, err in self.executor.run(ctx, ops, locality):
+                if err is CANCELLED:
+                    left.append(op)
+                    continue
+                if err is not None:
+                    ctx.log(f"Error {verb} {os.path.basename(op.src)}: {err}")
+                    ctx.record("error", src=op.src, dest=op.dest, error=str(err))
+                    m.count("move_errors")
+                    left.append(op)
+                    continue
+                if batch_id is not None:
+                    self.journal.done(batch_id, op.payload)
+                self.index_moved(op.src, op.dest)
+                done.append(op)
+        finally:
+            if batch_id is not None:
+                self.journal.end(batch_id)
+            m.add_time("move", time.perf_counter() - start)
+            m.count("files_moved", len(done))
+            m.count("bytes_copied", self.executor.bytes_copied)
+        return done, left, batch_id
+
+    def _planned(self, started, names):
+        # Metrics for the planning half of a move batch
+        self.metrics.add_time("plan", time.perf_counter() - started)
+        self.metrics.count("dest_dirs_listed", names.listed)
+
+    def move_preview(self, ctx, items, mode):
+        # Move only the reference file to each sibling's folder.
+        # items: iterable of (ref_file, [sibling paths]); returns the batch of (dest, src) moves.
+        # Moves are planned first (conflicts resolved against disk plus the plan itself),
+        # then run by the executor, so cross-device copies overlap.
+        done, left, batch_id = self._execute(ctx, self.plan_preview(ctx, items, mode))
+        batch_moves = Batch(self.dirs, batch_id=batch_id)
+        for op in done:
+            ctx.log(f"Moved {os.path.basename(op.src)} → {os.path.dirname(op.dest)}")
+            ctx.record("moved", src=op.src, dest=op.dest)
+            batch_moves.append((op.dest, op.src))
+        if ctx.cancelled:
+            ctx.log("Move cancelled; files moved so far can be undone.")
+        return batch_moves
+
+    def plan_preview(self, ctx, items, mode):
+        # The MoveOps move_preview would run, in order, without moving anything
+        started = time.perf_counter()
+        ops = []
+        names = NameCache()
+        for ref_file, sibling_paths in items:
+            if ctx.cancelled:
+                break
+            ref_basename = os.path.basename(ref_file)
+            ref_path = os.path.abspath(ref_file)
+            for sib_path in sibling_paths:
+                target_dir = os.path.dirname(sib_path)
+                dest_path = os.path.join(target_dir, ref_basename)
+                if ref_path == os.path.abspath(dest_path):
+                    ctx.log(f"Skipped {ref_basename} (already in {target_dir})")
+                    ctx.record("skipped", src=ref_file, dest=dest_path, reason="already there")
+                    continue
+                exists = names.exists(dest_path)
+                if exists:
+                    self.metrics.count("conflicts")
+                    new_dest = self.resolve_conflict(dest_path, mode, names)
+                    if new_dest is None:
+                        ctx.log(f"Skipped {ref_basename} (exists in {target_dir})")
+                        ctx.record("skipped", src=ref_file, dest=dest_path, reason="exists")
+                        continue
+                    else:
+                        dest_path = new_dest
+                ops.append(MoveOp(ref_file, dest_path, overwrite=exists and mode == "overwrite", payload=len(ops)))
+                names.discard(ref_file)
+                names.add(dest_path)
+                # After moving, the next sibling folder is reached from the new location
+                ref_file = dest_path
+                ref_path = os.path.abspath(ref_file)
+        self._planned(started, names)
+        return ops
+
+    def move_orphans(self, ctx, items, mode):
+        # Move each orphan file to the folder of its first sibling.
+        # items: iterable of (base, {'orphan': [...], 'siblings': [...]}); returns the batch.
+        done, left, batch_id = self._execute(ctx, self.plan_orphans(ctx, items, mode))
+        batch_moves = Batch(self.dirs, batch_id=batch_id)
+        for op in done:
+            ctx.log(f"Moved orphan {os.path.basename(op.src)} → {os.path.dirname(op.dest)}")
+            ctx.record("moved", src=op.src, dest=op.dest)
+            batch_moves.append((op.dest, op.src))
+        if ctx.cancelled:
+            ctx.log("Orphan move cancelled; files moved so far can be undone.")
+        return batch_moves
+
+    def plan_orphans(self, ctx, items, mode):
+        # The MoveOps move_orphans would run, in order, without moving anything
+        started = time.perf_counter()
+        ops = []
+        names = NameCache()
+        for base, info in items:
+            if ctx.cancelled:
+                break
+            orphans = info['orphan']
+            siblings = info['siblings']
+            if not siblings or not orphans:
+                continue
+            target_folder = os.path.dirname(os.path.normpath(siblings[0]))
+            for orphan_file in orphans:
+                orphan_file = os.path.normpath(orphan_file)
+                orphan_basename = os.path.basename(orphan_file)
+                dest_path = os.path.join(target_folder, orphan_basename)
+                dest_path = os.path.normpath(dest_path)
+                if not names.exists(orphan_file):
+                    ctx.log(f"Skipped (not found): {orphan_file}")
+                    ctx.record("skipped", src=orphan_file, dest=dest_path, reason="not found")
+                    continue
+                if os.path.abspath(orphan_file) == os.path.abspath(dest_path):
+                    ctx.log(f"Skipped {orphan_basename} (already in {target_folder})")
+                    ctx.record("skipped", src=orphan_file, dest=dest_path, reason="already there")
+                    continue
+                exists = names.exists(dest_path)
+                if exists:
+                    self.metrics.count("conflicts")
+                    new_dest = self.resolve_conflict(dest_path, mode, names)
+                    if new_dest is None:
+                        ctx.log(f"Skipped {orphan_basename} (exists in {target_folder})")
+                        ctx.record("skipped", src=orphan_file, dest=dest_path, reason="exists")
+                        continue
+                    else:
+                        dest_path = new_dest
+                ops.append(MoveOp(orphan_file, dest_path, overwrite=exists and mode == "overwrite", payload=len(ops)))
+                names.discard(orphan_file)
+                names.add(dest_path)
+        self._planned(started, names)
+        return ops
+
+    # ------------------------------ Move plans ------------------------------
+    def compile_plan(self, ctx, kind, items, mode, base_dir=None):
+        # kind "preview" takes move_preview items, "orphans" takes move_orphans items.
+        # Nothing is moved; the plan can be saved, reviewed and run later with execute_plan().
+        planner = self.plan_orphans if kind == "orphans" else self.plan_preview
+        with self.metrics.phase("stat sources"):
+            plan = MovePlan.from_ops(planner(ctx, items, mode), kind, mode, base_dir)
+        self.metrics.count("plan_moves", len(plan))
+        return plan
+
+    def check_plan(self, ctx, plan):
+        # Re-validates a plan against the disk; returns one problem (or None) per entry
+        with self.metrics.phase("validate"):
+            problems = plan.validate()
+        for entry, problem in zip(plan.entries, problems):
+            if problem is not None:
+                why = {"missing": "source missing", "changed": "source changed since planning",
+                       "exists": f"exists in {os.path.dirname(entry.dest)}"}[problem]
+                ctx.log(f"Skipped {os.path.basename(entry.src)} ({why})")
+                ctx.record("skipped", src=entry.src, dest=entry.dest, reason=problem)
+                self.metrics.count("plan_invalid")
+        return problems
+
+    def execute_plan(self, ctx, plan):
+        # Runs the still-valid moves of a plan, grouped by destination drive and folder rather
+        # than in plan order; returns the undoable batch, in the order the moves landed (the
+        # order the journal has them in, which undo and crash recovery rely on)
+        ops = plan.ops(self.check_plan(ctx, plan))
+        done, left, batch_id = self._execute(ctx, ops, locality=True)
+        batch_moves = Batch(self.dirs, batch_id=batch_id)
+        for op in done:
+            ctx.log(f"Moved {os.path.basename(op.src)} → {os.path.dirname(op.dest)}")
+            ctx.record("moved", src=op.src, dest=op.dest)
+            batch_moves.append((op.dest, op.src))
+        if ctx.cancelled:
+            ctx.log("Plan cancelled; files moved so far can be undone.")
+        return batch_moves
+
+    # ------------------------------ Undo/Redo ------------------------------
+    @property
+    def dirs(self):
+        return self.journal.dirs if self.journal is not None else self._dirs
+
+    def recover_history(self):
+        # Rebuild the undo/redo stacks from the journal, including batches cut short by a crash
+        if self.journal is not None:
+            self.history, self.redo_stack = self.journal.recover()
+        return len(self.history), len(self.redo_stack)
+
+    def _stack(self, op, batch):
+        if self.journal is not None and batch.id is not None:
+            self.journal.stack(op, batch.id)
+
+    def record_batch(self, batch_moves):
+        if not batch_moves:
+            return False
+        # Redo is cleared first: if the push never reaches the journal, recovery still finds
+        # the ended batch (see Journal.recover), but not a stale redo stack
+        self.redo_stack.clear()
+        if self.journal is not None:
+            self.journal.stack("RC")
+        self.history.append(batch_moves)
+        self._stack("H+", batch_moves)
+        return True
+
+    def take_undo(self):
+        batch = self.history.pop()
+        self._stack("H-", batch)
+        return batch
+
+    def take_redo(self):
+        batch = self.redo_stack.pop()
+        self._stack("R-", batch)
+        return batch
+
+    def _push(self, stack, op, batch):
+        if batch.id is None and self.journal is not None:
+            self.journal.store(batch)
+        stack.append(batch)
+        self._stack(op, batch)
+
+    def finish_undo(self, result):
+        undone, pending = result
+        if pending:
+            self._push(self.history, "H+", pending)
+        if undone:
+            self._push(self.redo_stack, "R+", undone)
+
+    def finish_redo(self, result):
+        redone, pending = result
+        if pending:
+            self._push(self.redo_stack, "R+", pending)
+        if redone:
+            self._push(self.history, "H+", redone)
+
+    def salvage_replay(self, batch):
+        # For an undo/redo of batch that raised instead of returning: the (replayed, pending)
+        # it would have returned, worked out from the disk since the failed run couldn't say.
+        # A pair whose current path is still there is pending; one whose file is back at its
+        # original path has landed. Pass the result to finish_undo/finish_redo so neither
+        # half drops out of history.
+        replayed = Batch(self.dirs)
+        pending = Batch(self.dirs)
+        for seq in range(len(batch) - 1, -1, -1):
+            current_path, original_path = batch[seq]
+            if os.path.lexists(current_path):
+                pending.append((current_path, original_path))
+            elif os.path.lexists(original_path):
+                replayed.append((original_path, current_path))
+        pending = Batch(self.dirs, reversed(pending))  # back to oldest first, like the batch
+        return replayed, pending
+
+    def replay_batch(self, ctx, batch, mode, verb, done_label):
+        # Moves every (current, original) pair of a batch back, newest first.
+        # Returns the reversed moves plus the pairs left untouched (cancelled or failed, so a
+        # later undo/redo can retry them), both as Batch.
+        started = time.perf_counter()
+        ops = []
+        names = NameCache()  # folder listings as they will be once the earlier ops ran
+        for seq in range(len(batch) - 1, -1, -1):
+            current_path, original_path = batch[seq]
+            if not names.exists(current_path):
+                ctx.log(f"Missing file (cannot {verb}): {current_path}")
+                ctx.record("skipped", src=current_path, dest=original_path, reason="missing")
+                continue
+            exists = names.exists(original_path)
+            if exists:
+                self.metrics.count("conflicts")
+                new_dest = self.resolve_conflict(original_path, mode, names)
+                if new_dest is None:
+                    ctx.log(f"{verb.capitalize()} skipped (exists): {os.path.basename(original_path)}")
+                    ctx.record("skipped", src=current_path, dest=original_path, reason="exists")
+                    continue
+                else:
+                    original_path = new_dest
+            ops.append(MoveOp(current_path, original_path, overwrite=exists and mode == "overwrite", payload=seq))
+            names.discard(current_path)
+            names.add(original_path)
+
+        self._planned(started, names)
+        source = getattr(batch, "id", None)
+        done, left, batch_id = self._execute(ctx, ops, kind=verb, source=source, verb=f"during {verb} of")
+        replayed = Batch(self.dirs, batch_id=batch_id)
+        for op in done:
+            replayed.append((op.dest, op.src))
+            ctx.log(f"{done_label} {os.path.basename(op.dest)}")
+            ctx.record("moved", src=op.src, dest=op.dest)
+        # Untouched pairs go back in their original (oldest first) order
+        pending = Batch(self.dirs, [batch[seq] for seq in sorted(op.payload for op in left)])
+        if pending:
+            why = "cancelled" if ctx.cancelled else "incomplete"
+            ctx.log(f"{verb.capitalize()} {why}; {len(pending)} file(s) left for the next {verb}.")
+        return replayed, pending
+
@@ -0,0 +1,42 @@
+class ExtensionMatcher:
+    # Compiled form of the extensions list, built once per scan.
+    # Every ".ext" entry and every "*suffix" entry whose suffix starts with a dot is keyed
+    # by its dot-split tail, so a filename is matched with one dict lookup per dot instead
+    # of one endswith() per extension. ".civitai.info" and ".info" both match
+    # "x.civitai.info"; ".preview.png" only matches names ending in ".preview.png".
+    # Wildcard suffixes that don't start with a dot ("*_v2.safetensors") keep using endswith.
+    def __init__(self, exts):
+        self.exts = None if exts is None else set(exts)  # None matches everything
+        self._by_tail = {}
+        self._loose = []
+        self._max_dots = 0
+        for e in self.exts or ():
+            suffix = e[1:] if e.startswith('*') else e
+            if suffix.startswith('.'):
+                self._by_tail.setdefault(suffix, []).append(e)
+                self._max_dots = max(self._max_dots, suffix.count('.'))
+            else:
+                self._loose.append((suffix, e))
+
+    def match(self, name):
+        # All extension entries that name ends with (empty list if none)
+        if self.exts is None:
+            return []
+        hits = []
+        end = len(name)
+        for _ in range(self._max_dots):
+            end = name.rfind('.', 0, end)
+            if end < 0:
+                break
+            found = self._by_tail.get(name[end:])
+            if found:
+                hits.extend(found)
+        for suffix, e in self._loose:
+            if name.endswith(suffix):
+                hits.append(e)
+        return hits
+
+    def matches(self, name):
+        if self.exts is None:
+            return True
+        return bool(self.match(name))
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Big model files are read by a few threads at once; hashlib releases the GIL while hashing,
+# and more readers than this mostly makes a spinning disk seek between files.
+DEFAULT_HASH_WORKERS = 4
+EDGE_SIZE = 1 << 20   # bytes hashed from each end of a file in the quick pass
+READ_SIZE = 8 << 20   # read buffer for full hashes
+
+def file_id(st):
+    # "device:inode"; stored as text because Windows file ids don't fit SQLite integers
+    return f"{st.st_dev}:{st.st_ino}"
+
+
+def quick_hash(path, size):
+    # sha256 of the size plus the first and last EDGE_SIZE bytes. Files no bigger than
+    # two edges are hashed whole, and then the quick hash is also the full hash.
+    if size <= 2 * EDGE_SIZE:
+        with open(path, "rb", buffering=0) as f:
+            return hashlib.sha256(f.read()).hexdigest(), True
+    h = hashlib.sha256(size.to_bytes(8, "little"))
+    with open(path, "rb", buffering=0) as f:
+        h.update(f.read(EDGE_SIZE))
+        f.seek(-EDGE_SIZE, os.SEEK_END)
+        h.update(f.read(EDGE_SIZE))
+    return h.hexdigest(), False
+
+
+def full_hash(path):
+    # Plain sha256 of the content (same value Civitai lists as SHA256)
+    h = hashlib.sha256()
+    buf = bytearray(READ_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+class DuplicateFinder:
+    # Finds files with identical content in stages, so most files are never read:
+    #   1. stat everything and bucket by size (a unique size can't have a duplicate)
+    #   2. quick-hash both ends of the files left
+    #   3. full-hash only files whose size and quick hash still collide
+    # Reads run on a thread pool; hashes go to a FileCache, so a repeat run only hashes
+    # new or changed files. Hard links to the same file count once.
+    def __init__(self, workers=DEFAULT_HASH_WORKERS, cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.files_hashed = 0
+        self.cache_hits = 0
+        self.bytes_read = 0
+        self.phase_times = {}  # "stat" / "quick hash" / "full hash" -> seconds in the last run()
+
+    def run(self, paths, check=None, status=None):
+        # Returns [(sha256, size, [paths])] for every group of two or more identical files,
+        # biggest files first. check() may raise to stop; hashes done so far are still cached.
+        self.files_hashed = self.cache_hits = self.bytes_read = 0
+        self.phase_times = {}
+        pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="hash")
+        fresh = {}  # file_id -> [size, mtime_ns, quick, full] hashed in this run
+        try:
+            if status is not None:
+                status("Comparing file sizes…")
+            started = time.perf_counter()
+            files = {}  # file_id -> (path, size, mtime_ns)
+            by_size = defaultdict(list)
+            for path, st in self._map(pool, _stat, paths, check):
+                if st is None or st.st_size == 0:
+                    continue
+                fid = file_id(st)
+                if fid not in files:
+                    by_size[st.st_size].append(fid)
+                elif files[fid][0] < path:
+                    continue  # another link to a file already seen; keep one path per file
+                files[fid] = (path, st.st_size, st.st_mtime_ns)
+            candidates = [fid for fids in by_size.values() if len(fids) > 1 for fid in fids]
+            started = self._lap("stat", started)
+
+            known = {}
+            if self.cache is not None and candidates:
+                known = self.cache.load({fid: files[fid][1:] for fid in candidates})
+            quick, full = {}, {}
+            todo = []
+            for fid in candidates:
+                hit = known.get(fid)
+                if hit and hit[0]:
+                    quick[fid] = hit[0]
+                    if hit[1]:
+                        full[fid] = hit[1]
+                    self.cache_hits += 1
+                else:
+                    todo.append(fid)
+
+            if status is not None:
+                status(f"Quick-hashing {len(todo)} file(s)…")
+            for fid, result in self._map(pool, lambda f: quick_hash(files[f][0], files[f][1]), todo, check):
+                if result is None:
+                    continue
+                quick[fid], whole = result
+                size = files[fid][1]
+                self.files_hashed += 1
+                self.bytes_read += size if whole else 2 * EDGE_SIZE
+                fresh[fid] = [size, files[fid][2], quick[fid], quick[fid] if whole else None]
+                if whole:
+                    full[fid] = quick[fid]
+            started = self._lap("quick hash", started)
+
+            by_quick = defaultdict(list)
+            for fid, q in quick.items():
+                by_quick[(files[fid][1], q)].append(fid)
+            todo = [fid for fids in by_quick.values() if len(fids) > 1 for fid in fids if fid not in full]
+
+            if status is not None:
+                status(f"Full-hashing {len(todo)} file(s)…")
+            for fid, digest in self._map(pool, lambda f: full_hash(files[f][0]), todo, check):
+                if digest is None:
+                    continue
+                full[fid] = digest
+                self.bytes_read += files[fid][1]
+                entry = fresh.setdefault(fid, [files[fid][1], files[fid][2], quick[fid], None])
+                entry[3] = digest
+            self._lap("full hash", started)
+
+            groups = defaultdict(list)
+            for fids in by_quick.values():
+                if len(fids) > 1:
+                    for fid in fids:
+                        if fid in full:
+                            groups[(files[fid][1], full[fid])].append(files[fid][0])
+            return sorted(((digest, size, sorted(group)) for (size, digest), group in groups.items() if len(group) > 1),
+                          key=lambda g: (-g[1], g[2]))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if self.cache is not None and fresh:
+                self.cache.save((fid, entry[0], entry[1], entry[2:]) for fid, entry in fresh.items())
+
+    def _lap(self, phase, started):
+        now = time.perf_counter()
+        self.phase_times[phase] = now - started
+        return now
+
+    def _map(self, pool, fn, items, check):
+        # Yields (item, fn(item)) in completion order; OSError (file gone, no access) gives None
+        futures = {pool.submit(_guard, fn, item): item for item in items}
+        for fut in as_completed(futures):
+            if check is not None:
+                check()
+            yield futures[fut], fut.result()
+
+
+def _guard(fn, item):
+    try:
+        return fn(item)
+    except OSError:
+        return None
+
+
+def _stat(path):
+    return os.stat(path)
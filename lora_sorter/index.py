@@ -0,0 +1,203 @@
+import os
+from collections import defaultdict
+
+from lora_sorter.extensions import ExtensionMatcher
+from lora_sorter.keys import EXACT
+from lora_sorter.walk import DEFAULT_WORKERS, walk_files
+
+
+def split_base(name):
+    # Sibling rule: everything before the first dot is the base name, the rest
+    # is the extension tail (".safetensors", ".civitai.info", ".preview.png", …)
+    base, dot, tail = name.partition('.')
+    return base, dot + tail
+
+
+def base_roots(base_dirs):
+    # One base folder or a list of them -> tuple of absolute roots, in the given order,
+    # without repeats or roots that sit inside another root (they'd be indexed twice)
+    if isinstance(base_dirs, (str, bytes, os.PathLike)):
+        base_dirs = [base_dirs]
+    roots = []
+    for d in base_dirs:
+        d = os.path.abspath(d)
+        if d not in roots:
+            roots.append(d)
+    return tuple(r for r in roots
+                 if not any(r != o and r.startswith(o.rstrip(os.sep) + os.sep) for o in roots))
+
+
+class ScanIndex:
+    # One in-memory index of the base folder(s), shared by Preview, Orphan Finder
+    # and Duplicate Detector so the tree is only walked once per session.
+    # With several base roots (e.g. one per drive) everything is merged into one index:
+    # each root's own files are reference/orphan candidates, their subfolders hold siblings.
+    # root is the first root, the one new reference files usually come from.
+    # Files are grouped by keys.key(name): the base name itself by default, or a normalised
+    # form of it (case, separators, version tags) that is computed once per file right here.
+    def __init__(self, roots, keys=EXACT):
+        self.roots = base_roots(roots)
+        self.root = self.roots[0]
+        self.keys = keys
+        self.key = keys.key
+        self.dirs = {}                    # dir -> key -> set(file names)
+        self.by_base = defaultdict(set)   # key -> set(dirs containing it)
+        self.file_count = 0
+        self.dirs_listed = 0              # folders read by the last build()
+        self.loose_unmatched = 0          # loose files without siblings, see loose_siblings()
+
+    def build(self, workers=DEFAULT_WORKERS, check=None):
+        self.dirs = {}
+        self.by_base = defaultdict(set)
+        self.file_count = 0
+        self.dirs_listed = 0
+        for root, files in walk_files(self.roots, workers, check):
+            self.dirs_listed += 1
+            self.dirs.setdefault(root, {})
+            for f in files:
+                self.add_name(root, f)
+        return self
+
+    def add_name(self, folder, name):
+        # Fast path for scanners: folder must already be absolute and inside root
+        key = self.key(name)
+        names = self.dirs.setdefault(folder, {}).setdefault(key, set())
+        if name not in names:
+            names.add(name)
+            self.by_base[key].add(folder)
+            self.file_count += 1
+
+    # ---- lookups ----
+    def files_in(self, folder, key):
+        names = self.dirs.get(folder, {}).get(key, ())
+        return [os.path.join(folder, n) for n in sorted(names)]
+
+    def iter_files(self):
+        for folder, keys in self.dirs.items():
+            for names in keys.values():
+                for n in names:
+                    yield os.path.join(folder, n)
+
+    def folders_with(self, base):
+        return sorted(self.by_base.get(base, ()))
+
+    def siblings(self, ref_file):
+        # Files in subfolders of the roots sharing the reference's key (base name).
+        # The roots themselves are skipped, and so is the reference's own folder
+        # (including everything below it) when that folder is a direct child of a root.
+        ref_path = os.path.abspath(ref_file)
+        ref_folder = os.path.dirname(ref_path)
+        ref_base = self.key(os.path.basename(ref_path))
+        skip_tree = os.path.dirname(ref_folder) in self.roots
+        result = []
+        for folder in self.folders_with(ref_base):
+            if folder in self.roots:
+                continue
+            if skip_tree and (folder == ref_folder or folder.startswith(ref_folder + os.sep)):
+                continue
+            for path in self.files_in(folder, ref_base):
+                if path != ref_path:
+                    result.append(path)
+        return result
+
+    def loose_siblings(self, check=None):
+        # Every file sitting directly in a root, joined against the subfolder index in one
+        # pass: one by_base lookup per distinct key, shared by all loose files with that key.
+        # Yields (ref_file, [sibling paths]) for the loose files that have siblings, and
+        # counts the ones that don't in self.loose_unmatched.
+        self.loose_unmatched = 0
+        for root in self.roots:
+            for key, names in sorted(self.dirs.get(root, {}).items()):
+                if check is not None:
+                    check()
+                siblings = []
+                for folder in sorted(self.by_base.get(key, ())):
+                    if folder not in self.roots:
+                        prefix = os.path.join(folder, "")
+                        siblings.extend(prefix + n for n in sorted(self.dirs[folder][key]))
+                if not siblings:
+                    self.loose_unmatched += len(names)
+                    continue
+                prefix = os.path.join(root, "")
+                for name in sorted(names):
+                    yield prefix + name, list(siblings)
+
+    # ---- incremental updates (keeps the index valid after moves) ----
+    def _inside(self, path):
+        return any(path == r or path.startswith(r + os.sep) for r in self.roots)
+
+    def add_file(self, path):
+        path = os.path.abspath(path)
+        folder, name = os.path.split(path)
+        if self._inside(folder):
+            self.add_name(folder, name)
+
+    def remove_file(self, path):
+        path = os.path.abspath(path)
+        folder, name = os.path.split(path)
+        base = self.key(name)
+        bases = self.dirs.get(folder)
+        if not bases or name not in bases.get(base, ()):
+            return
+        bases[base].discard(name)
+        self.file_count -= 1
+        if not bases[base]:
+            del bases[base]
+            self.by_base[base].discard(folder)
+            if not self.by_base[base]:
+                del self.by_base[base]
+
+    def move_file(self, src, dest):
+        self.remove_file(src)
+        self.add_file(dest)
+
+    def remove_tree(self, folder):
+        # Drops a folder and everything below it; returns the keys that were in it
+        folder = os.path.abspath(folder)
+        prefix = folder + os.sep
+        removed = set()
+        for d in [d for d in self.dirs if d == folder or d.startswith(prefix)]:
+            for base, names in self.dirs.pop(d).items():
+                self.file_count -= len(names)
+                removed.add(base)
+                self.by_base[base].discard(d)
+                if not self.by_base[base]:
+                    del self.by_base[base]
+        return removed
+
+
+def find_orphans(index, exts, check=None, bases=None):
+    # Single pass over each base root's own files: a base name there is an orphan when
+    # some listed extension is missing next to it. Its sibling files in subfolders (of any
+    # root) come straight from by_base, so nothing is listed twice. bases limits the check
+    # to those base names (e.g. the ones a watcher just saw change).
+    # Yields (base, missing_exts, orphan_files, sibling_files), once per root the base is in.
+    expected = set(exts)
+    matcher = ExtensionMatcher(expected)
+    for root in index.roots:
+        in_root = index.dirs.get(root, {})
+        if bases is None:
+            candidates = in_root.items()
+        else:
+            candidates = [(b, in_root[b]) for b in bases if b in in_root]
+        for base, names in candidates:
+            if check is not None:
+                check()
+            have = set()
+            orphan_files = []
+            for name in sorted(names):
+                hit = matcher.match(name)
+                if hit:
+                    have.update(hit)
+                    orphan_files.append(os.path.join(root, name))
+            missing = expected - have
+            if not have or not missing:
+                continue
+            sibling_files = []
+            for folder in index.folders_with(base):
+                if folder in index.roots:
+                    continue
+                for name in sorted(index.dirs[folder][base]):
+                    if matcher.matches(name):
+                        sibling_files.append(os.path.join(folder, name))
+            yield base, missing, orphan_files, sibling_files
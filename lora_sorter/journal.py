@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Sequence
+
+from lora_sorter.store import cache_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SYNC_EVERY = 256      # completed moves between fsyncs
+SYNC_INTERVAL = 1.0   # …or seconds, whichever comes first
+MAX_JOURNALS = 16     # instances running at once, each with a journal of its own
+
+
+class DirTable:
+    # Interned folder paths; batches and the journal refer to folders by small integer ids
+    def __init__(self):
+        self.paths = []
+        self.ids = {}
+        self.on_new = None  # (dir_id, path) -> None, lets the journal write each folder once
+
+    def intern(self, folder):
+        dir_id = self.ids.get(folder)
+        if dir_id is None:
+            dir_id = len(self.paths)
+            self.paths.append(folder)
+            self.ids[folder] = dir_id
+            if self.on_new is not None:
+                self.on_new(dir_id, folder)
+        return dir_id
+
+    def split(self, path):
+        folder, name = os.path.split(path)
+        return self.intern(folder), name
+
+    def join(self, dir_id, name):
+        return os.path.join(self.paths[dir_id], name)
+
+
+class Batch(Sequence):
+    # One undoable batch: a sequence of (current_path, original_path) pairs stored as
+    # (dir id, name, dir id, name) so large batches don't repeat folder strings.
+    def __init__(self, dirs, pairs=(), batch_id=None):
+        self.dirs = dirs
+        self.id = batch_id
+        self._items = []
+        for pair in pairs:
+            self.append(pair)
+
+    def append(self, pair):
+        current, original = pair
+        self._items.append(self.dirs.split(current) + self.dirs.split(original))
+
+    def _pair(self, item):
+        cur_dir, cur_name, orig_dir, orig_name = item
+        return self.dirs.join(cur_dir, cur_name), self.dirs.join(orig_dir, orig_name)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._pair(item) for item in self._items[i]]
+        return self._pair(self._items[i])
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Journal:
+    # Append-only, crash-safe record of every move and of the undo/redo stacks.
+    # One JSON array per line:
+    #   ["D", dir_id, path]                      folder interned
+    #   ["B", batch, kind, source_batch]         batch started (kind: move, undo, redo, pending)
+    #   ["M", batch, seq, dir, name, dir, name]  move intent (source, destination), before moving
+    #   ["C", batch, seq]                        move landed
+    #   ["E", batch]                             batch finished
+    #   ["H+"|"H-"|"R+"|"R-", batch], ["RC"]     history / redo stack push, pop, redo clear
+    # Intents are fsynced before a batch starts; completions are fsynced in groups.
+    # recover() rebuilds both stacks, including half-finished batches, and compacts the file.
+    # A journal belongs to one process at a time: recover() takes an exclusive lock on
+    # "<journal>.lock" that close() releases. With the default path, a second instance
+    # takes the next free journal-N.jsonl instead, so one never compacts away another's moves.
+    def __init__(self, path=None):
+        self.path = path
+        self.dirs = DirTable()
+        self._lock = threading.Lock()
+        self._f = None
+        self._lock_f = None
+        self._next_id = 1
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # ---- writing ----
+    def _write(self, rec):
+        self._f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _dir_added(self, dir_id, path):
+        with self._lock:
+            if self._f is not None:
+                self._write(["D", dir_id, path])
+
+    def sync(self):
+        with self._lock:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def begin(self, kind, source=None):
+        with self._lock:
+            batch_id = self._next_id
+            self._next_id += 1
+            self._write(["B", batch_id, kind, source])
+        return batch_id
+
+    def intents(self, batch_id, moves):
+        # moves: iterable of (seq, src, dest); written and synced before any of them runs
+        for seq, src, dest in moves:
+            src_dir, src_name = self.dirs.split(src)
+            dest_dir, dest_name = self.dirs.split(dest)
+            with self._lock:
+                self._write(["M", batch_id, seq, src_dir, src_name, dest_dir, dest_name])
+        self.sync()
+
+    def done(self, batch_id, seq):
+        with self._lock:
+            self._write(["C", batch_id, seq])
+            self._unsynced += 1
+            due = self._unsynced >= SYNC_EVERY or time.monotonic() - self._last_sync >= SYNC_INTERVAL
+        if due:
+            self.sync()
+
+    def end(self, batch_id):
+        with self._lock:
+            self._write(["E", batch_id])
+        self.sync()
+
+    def stack(self, op, batch_id=None):
+        with self._lock:
+            self._write([op] if batch_id is None else [op, batch_id])
+        self.sync()
+
+    def store(self, batch, kind="pending"):
+        # Journal an already-performed batch (e.g. moves left over by a cancelled undo)
+        batch_id = self.begin(kind)
+        moves = [(seq, original, current) for seq, (current, original) in enumerate(batch)]
+        self.intents(batch_id, moves)
+        with self._lock:
+            for seq, _, _ in moves:
+                self._write(["C", batch_id, seq])
+            self._write(["E", batch_id])
+        self.sync()
+        batch.id = batch_id
+        return batch_id
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.flush()
+                os.fsync(self._f.fileno())
+                self._f.close()
+                self._f = None
+            if self._lock_f is not None:
+                self._lock_f.close()  # releases the lock
+                self._lock_f = None
+
+    # ---- ownership ----
+    def _claim(self):
+        # Lock the journal for this process; the default path falls through to the first free slot
+        if self._lock_f is not None:
+            return
+        if self.path is not None:
+            if not self._try_lock(self.path):
+                raise RuntimeError(f"Journal {self.path} is in use by another process")
+            return
+        folder = cache_dir()
+        for slot in range(MAX_JOURNALS):
+            path = os.path.join(folder, "journal.jsonl" if slot == 0 else f"journal-{slot}.jsonl")
+            if self._try_lock(path):
+                self.path = path
+                return
+        raise RuntimeError(f"All {MAX_JOURNALS} journals in {folder} are in use")
+
+    def _try_lock(self, path):
+        f = open(path + ".lock", "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._lock_f = f
+        return True
+
+    # ---- recovery ----
+    def recover(self):
+        # Returns (history, redo_stack) as lists of Batch and reopens the journal for appending
+        self._claim()
+        dirs, batches, ops = {}, {}, []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break  # torn last line after a crash
+                    kind = rec[0]
+                    if kind == "D":
+                        dirs[rec[1]] = rec[2]
+                    elif kind == "B":
+                        batches[rec[1]] = {"kind": rec[2], "source": rec[3], "intents": {}, "done": [], "ended": False}
+                    elif kind == "M" and rec[1] in batches:
+                        src = os.path.join(dirs[rec[3]], rec[4])
+                        dest = os.path.join(dirs[rec[5]], rec[6])
+                        batches[rec[1]]["intents"][rec[2]] = (src, dest)
+                    elif kind == "C" and rec[1] in batches:
+                        batches[rec[1]]["done"].append(rec[2])
+                    elif kind == "E" and rec[1] in batches:
+                        batches[rec[1]]["ended"] = True
+                    else:
+                        ops.append(rec)
+
+        def pairs(batch_id):
+            info = batches.get(batch_id)
+            if info is None:
+                return []
+            return [(info["intents"][s][1], info["intents"][s][0]) for s in info["done"] if s in info["intents"]]
+
+        history, redo = [], []
+        stacks = {"H": history, "R": redo}
+        stacked = set()  # batches some stack record mentions
+        for rec in ops:
+            if rec[0] == "RC":
+                redo.clear()
+            elif rec[0][0] in stacks:
+                stacked.add(rec[1])
+                stack = stacks[rec[0][0]]
+                if rec[0][1] == "+":
+                    stack.append(rec[1])
+                elif rec[1] in stack:
+                    stack.remove(rec[1])
+
+        # Half-finished batches: a move whose intent was written but not its completion
+        # happened if the source is gone and the destination exists, or is where a later
+        # move that happened started (a file hopping ref -> s1 -> s2 leaves nothing in s1).
+        # Intents are checked newest first so every hop of such a chain is found.
+        # A move batch that ended but was never pushed on history (a crash between the last
+        # move and the GUI recording the batch) is treated the same way.
+        synthetic = {}
+        for batch_id, info in sorted(batches.items()):
+            if info["ended"] and (info["kind"] != "move" or batch_id in stacked):
+                continue
+            done = set(info["done"])
+            moved_on = {info["intents"][s][0] for s in done if s in info["intents"]}
+            landed_now = []
+            for seq, (src, dest) in sorted(info["intents"].items(), reverse=True):
+                if seq not in done and not os.path.exists(src) and (dest in moved_on or os.path.exists(dest)):
+                    landed_now.append(seq)
+                    moved_on.add(src)
+            info["done"].extend(sorted(landed_now))  # in plan order, so undo unwinds the chain
+            done.update(landed_now)
+            info["ended"] = True
+            landed = bool(info["done"])
+            if info["kind"] == "move":
+                if landed:
+                    history.append(batch_id)
+                    redo.clear()
+            elif info["kind"] in ("undo", "redo"):
+                # Pairs of the source batch whose replay never landed go back where they came from
+                source = pairs(info["source"])
+                left = [source[s] for s in sorted(info["intents"]) if s not in done and s < len(source)]
+                mine, theirs = (redo, history) if info["kind"] == "undo" else (history, redo)
+                if landed:
+                    mine.append(batch_id)
+                if left:
+                    synthetic_id = max(batches) + 1 + len(synthetic)
+                    synthetic[synthetic_id] = left
+                    theirs.append(synthetic_id)
+
+        self.dirs = DirTable()
+        live_history = [Batch(self.dirs, synthetic.get(b) or pairs(b), b) for b in history]
+        live_redo = [Batch(self.dirs, synthetic.get(b) or pairs(b), b) for b in redo]
+        self._next_id = max(list(batches) + list(synthetic) + [0]) + 1
+        self._compact(live_history, live_redo)
+        return live_history, live_redo
+
+    def _compact(self, history, redo):
+        # Rewrite the journal with only the batches still on a stack
+        tmp = self.path + ".tmp"
+        self._f = open(tmp, "w", encoding="utf-8")
+        for dir_id, path in enumerate(self.dirs.paths):
+            self._write(["D", dir_id, path])
+        for batch in history + redo:
+            self._write(["B", batch.id, "move", None])
+            for seq, item in enumerate(batch._items):
+                cur_dir, cur_name, orig_dir, orig_name = item
+                self._write(["M", batch.id, seq, orig_dir, orig_name, cur_dir, cur_name])
+                self._write(["C", batch.id, seq])
+            self._write(["E", batch.id])
+        for batch in history:
+            self._write(["H+", batch.id])
+        for batch in redo:
+            self._write(["R+", batch.id])
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(tmp, self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+        self.dirs.on_new = self._dir_added
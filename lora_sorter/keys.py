@@ -0,0 +1,92 @@
+import re
+
+# How a file name is split into base name + extension tail before the base is normalised:
+#   "first"  everything before the first dot ("Degree.preview.png" -> "Degree"), the v15 rule
+#   "last"   os.path.splitext style ("My.Lora.safetensors" -> "My.Lora"), the original build's rule
+#   "known"  strip the longest known multi-dot tail, else the last dot
+#            ("My.Lora.preview.png" -> "My.Lora", "My.Lora.safetensors" -> "My.Lora")
+DOT_RULES = ("first", "last", "known")
+KNOWN_TAILS = (".civitai.info", ".preview.png", ".preview.jpg", ".preview.jpeg", ".preview.webp",
+               ".metadata.json", ".civitai.json", ".cm-info.json")
+
+_SEPARATORS = re.compile(r"[\s_\-.]+")
+_VERSION = re.compile(r"(?<=.)[\s_\-.]+v\d+(?:[._]\d+)*$", re.IGNORECASE)
+
+
+def _casefold(base):
+    return base.casefold()
+
+
+def _separators(base):
+    # Runs of spaces, underscores, hyphens and dots all count as one "_"
+    return _SEPARATORS.sub("_", base).strip("_") or base
+
+
+def _version(base):
+    # "MyLora_v2", "MyLora-V2.1", "MyLora v3" -> "MyLora"
+    return _VERSION.sub("", base)
+
+
+# Normalisation steps by name, applied in this order to the base name. Add an entry here
+# to make a new step available to the GUI and the CLI's --match option.
+KEY_STEPS = {
+    "case": _casefold,
+    "separators": _separators,
+    "version": _version,
+}
+
+
+class KeyRule:
+    # Turns a file name into the key siblings are grouped by. The index computes it once per
+    # file, so however loose the rule, matching stays a dict lookup. The default (first dot,
+    # no steps) is the plain v15 rule: the key is the base name exactly.
+    def __init__(self, steps=(), dots="first"):
+        if dots not in DOT_RULES:
+            raise ValueError(f"unknown dot rule {dots!r} (use one of {', '.join(DOT_RULES)})")
+        unknown = [s for s in steps if s not in KEY_STEPS]
+        if unknown:
+            raise ValueError(f"unknown match step(s): {', '.join(unknown)} (use {', '.join(KEY_STEPS)})")
+        self.steps = tuple(s for s in KEY_STEPS if s in steps)
+        self.dots = dots
+        self._funcs = [KEY_STEPS[s] for s in self.steps]
+        self._known = sorted(KNOWN_TAILS, key=len, reverse=True)
+        if not self._funcs and dots == "first":
+            self.key = _first_dot  # the default rule runs once per indexed file; skip the generic path
+
+    def __eq__(self, other):
+        return isinstance(other, KeyRule) and (self.steps, self.dots) == (other.steps, other.dots)
+
+    def __hash__(self):
+        return hash((self.steps, self.dots))
+
+    def __repr__(self):
+        return f"KeyRule(steps={self.steps!r}, dots={self.dots!r})"
+
+    def base(self, name):
+        if self.dots == "first":
+            return name.partition('.')[0]
+        if self.dots == "known":
+            lower = name.lower()
+            for tail in self._known:
+                if lower.endswith(tail) and len(name) > len(tail):
+                    return name[:-len(tail)]
+        cut = name.rfind('.')
+        return name[:cut] if cut > 0 else name
+
+    def key(self, name):
+        base = self.base(name)
+        for f in self._funcs:
+            base = f(base)
+        return base
+
+
+def _first_dot(name):
+    return name.partition('.')[0]
+
+
+EXACT = KeyRule()
+
+
+def parse_key_rule(steps="", dots="first"):
+    # "case,separators" style option string -> KeyRule
+    return KeyRule([s.strip() for s in (steps or "").split(",") if s.strip()], dots)
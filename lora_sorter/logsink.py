@@ -0,0 +1,183 @@
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+
+from lora_sorter.store import cache_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows, where a log another instance has open can't be deleted anyway
+    fcntl = None
+
+DEFAULT_MAX_LINES = 5000
+DEFAULT_FLUSH_MS = 100
+KEEP_SESSIONS = 10
+KEEP_RECENT = 24 * 3600  # session logs written to this recently are never pruned
+
+# Debug log levels; messages are only formatted when their level is enabled
+OFF, INFO, DEBUG, TRACE = 0, 1, 2, 3
+LEVELS = {"off": OFF, "info": INFO, "debug": DEBUG, "trace": TRACE}
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUPS = 3
+
+
+def log_dir():
+    path = os.path.join(cache_dir(), "logs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prune_logs(folder, keep=KEEP_SESSIONS):
+    # Session logs are named session-<timestamp>-<name>.log; keep the newest few per name.
+    # Logs of other running instances are left alone: they hold a lock on their file (see
+    # LogSink), and anything written to in the last KEEP_RECENT seconds counts as in use.
+    by_name = {}
+    for f in os.listdir(folder):
+        if f.startswith("session-") and f.endswith(".log"):
+            by_name.setdefault(f.rsplit("-", 1)[-1], []).append(f)
+    now = time.time()
+    for files in by_name.values():
+        for f in sorted(files)[:-keep]:
+            path = os.path.join(folder, f)
+            try:
+                if now - os.path.getmtime(path) < KEEP_RECENT or _in_use(path):
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _in_use(path):
+    if fcntl is None:
+        return False
+    with open(path, "rb") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+    return False
+
+
+class LogSink:
+    # Buffers log lines and writes them to a Text widget in one insert per timer tick.
+    # The widget only keeps the newest max_lines lines; the full history goes to a file on disk.
+    # write() is thread-safe; the widget is only touched from the Tk timer.
+    def __init__(self, root, widget, name, max_lines=DEFAULT_MAX_LINES, flush_ms=DEFAULT_FLUSH_MS):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.flush_ms = flush_ms
+        self._pending = deque(maxlen=max_lines)  # ring buffer: lines older than the cap never reach the widget
+        self._lock = threading.Lock()
+        self._has_text = False
+        # Time spent inserting into the widget, and lines inserted, since the sink was made
+        self.flush_seconds = 0.0
+        self.lines_flushed = 0
+        folder = log_dir()
+        prune_logs(folder)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.history_path = os.path.join(folder, f"session-{stamp}-{os.getpid()}-{name}.log")
+        self._history = open(self.history_path, "w", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self._history.fileno(), fcntl.LOCK_SH)  # marks the log as in use for prune_logs
+        self._after = self.root.after(self.flush_ms, self._tick)
+
+    def write(self, text):
+        # Lines written after close() (e.g. by a task still finishing) are dropped
+        with self._lock:
+            if self._history is None:
+                return
+            self._pending.append(text)
+            self._history.write(text + "\n")
+            self._has_text = True
+
+    def _tick(self):
+        self.flush()
+        self._after = self.root.after(self.flush_ms, self._tick)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            lines = list(self._pending)
+            self._pending.clear()
+            if self._history is not None:
+                self._history.flush()
+        start = time.perf_counter()
+        self.widget.insert("end", "\n".join(lines) + "\n")
+        # Text always ends with one extra empty line, so "end-1c" is on line count + 1
+        excess = int(self.widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.widget.delete("1.0", f"{excess + 1}.0")
+        self.widget.see("end")
+        self.flush_seconds += time.perf_counter() - start
+        self.lines_flushed += len(lines)
+
+    @property
+    def empty(self):
+        return not self._has_text
+
+    def history(self):
+        # Full log of this session, including lines trimmed from the widget
+        with self._lock:
+            if self._history is not None:
+                self._history.flush()
+        with open(self.history_path, encoding="utf-8") as f:
+            return f.read()
+
+    def close(self):
+        # Stops the flush timer and closes the session file, which also releases its lock
+        self.root.after_cancel(self._after)
+        with self._lock:
+            if self._history is not None:
+                self._history.close()
+                self._history = None
+
+
+class DebugLog:
+    # Level-gated front end for the debug pane. info/debug lines go to the pane's LogSink,
+    # trace lines (one per folder/file) go to a rotating file instead of the widget.
+    # Arguments are %-formatted only after the level check, so disabled calls are nearly free;
+    # hot loops should still test enabled() first to skip building the arguments.
+    def __init__(self, sink, level=INFO):
+        self.sink = sink
+        self.level = level
+        self._tracer = None
+
+    def set_level(self, name):
+        self.level = LEVELS.get(name, INFO)
+
+    def enabled(self, level):
+        return self.level >= level
+
+    def info(self, msg, *args):
+        if self.level >= INFO:
+            self.sink.write(msg % args if args else msg)
+
+    def debug(self, msg, *args):
+        if self.level >= DEBUG:
+            self.sink.write(msg % args if args else msg)
+
+    def trace(self, msg, *args):
+        if self.level >= TRACE:
+            self._trace_logger().debug(msg, *args)
+
+    @property
+    def trace_path(self):
+        return os.path.join(log_dir(), "trace.log")
+
+    def _trace_logger(self):
+        if self._tracer is None:
+            logger = logging.getLogger("lora_sorter.trace")
+            logger.propagate = False
+            logger.setLevel(logging.DEBUG)
+            if not logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(
+                    self.trace_path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(asctime)s [TRACE] %(message)s"))
+                logger.addHandler(handler)
+            self._tracer = logger
+        return self._tracer
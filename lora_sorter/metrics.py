@@ -0,0 +1,85 @@
+import json
+import time
+from contextlib import contextmanager
+
+# Throughput figures derived from counters: (counter, phases it's timed over, label, divisor)
+RATES = (
+    ("entries_seen", ("scan",), "entries/s", 1),
+    ("files_moved", ("move",), "files/s", 1),
+    ("bytes_copied", ("move",), "MB/s copied", 1e6),
+    ("bytes_hashed", ("quick hash", "full hash"), "MB/s hashed", 1e6),
+    ("headers_read", ("headers",), "headers/s", 1),
+)
+
+
+class Metrics:
+    # Phase timers and counters for one operation (one GUI task or one CLI command).
+    # Updated from the operation's own thread; pool workers report back through it.
+    def __init__(self, name=""):
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.elapsed = None
+        self.outcome = None  # e.g. "Done", "Failed", "Cancelled"; set by the caller
+        self.phases = {}    # phase -> seconds, in the order first seen
+        self.counters = {}  # counter -> int
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._t0
+        return self
+
+    def rates(self):
+        out = {}
+        for counter, phases, label, divisor in RATES:
+            n = self.counters.get(counter)
+            seconds = sum(self.phases.get(p, 0.0) for p in phases)
+            if n and seconds > 0:
+                out[label] = n / divisor / seconds
+        return out
+
+    def as_dict(self):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self._t0
+        return {
+            "operation": self.name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "outcome": self.outcome,
+            "elapsed": round(elapsed, 6),
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+            "rates": {k: round(v, 3) for k, v in self.rates().items()},
+        }
+
+    def summary(self):
+        # One line for the status bar: total, biggest phases, counters, rates
+        d = self.as_dict()
+        parts = [f"{d['elapsed']:.2f}s"]
+        top = sorted(d["phases"].items(), key=lambda kv: -kv[1])[:4]
+        if top:
+            parts.append(", ".join(f"{k} {v:.2f}s" for k, v in top))
+        if d["counters"]:
+            parts.append(", ".join(f"{k.replace('_', ' ')} {v:,}" for k, v in d["counters"].items()))
+        if d["rates"]:
+            parts.append(", ".join(f"{v:,.0f} {k}" if v >= 10 else f"{v:.2f} {k}" for k, v in d["rates"].items()))
+        return " · ".join(parts)
+
+
+def write_metrics(path, runs):
+    # runs: Metrics objects, oldest first
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"operations": [m.as_dict() for m in runs]}, f, indent=2)
+        f.write("\n")
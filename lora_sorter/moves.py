@@ -0,0 +1,255 @@
+import errno
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Cross-device moves are full copies; a couple of streams per destination drive keeps
+# network links busy without making spinning disks seek between files.
+DEFAULT_PER_DEVICE = 2
+
+CANCELLED = object()  # result marker for ops that were never started
+
+
+class MoveOp:
+    # One planned move. overwrite=True replaces an existing destination atomically.
+    # payload is whatever the caller needs back with the result.
+    __slots__ = ("src", "dest", "overwrite", "payload")
+
+    def __init__(self, src, dest, overwrite=False, payload=None):
+        self.src = src
+        self.dest = dest
+        self.overwrite = overwrite
+        self.payload = payload
+
+
+def chain_jobs(ops):
+    # Group ops into jobs that must run in order: ops touching the same path, as source or
+    # destination, share a job and keep their plan order. That covers a file hopping
+    # through several folders and a move into a name an earlier move frees, in every mode.
+    parent = list(range(len(ops)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}  # normalised path -> an op touching it
+    for i, op in enumerate(ops):
+        for path in (op.src, op.dest):
+            key = os.path.normcase(path)
+            j = owner.setdefault(key, i)
+            if j != i:
+                parent[find(i)] = find(j)
+    jobs = {}
+    for i, op in enumerate(ops):
+        jobs.setdefault(find(i), []).append(op)
+    return list(jobs.values())
+
+
+def locality_order(jobs):
+    # Jobs sorted by destination folder (then source folder), so each folder's moves run
+    # back to back. Jobs never depend on each other (see chain_jobs), so any order is safe.
+    return sorted(jobs, key=lambda job: (os.path.dirname(job[0].dest), os.path.dirname(job[0].src)))
+
+
+def move_one(op):
+    # Returns the bytes copied: 0 for a rename, the file size for a cross-device move
+    if not op.overwrite and os.path.exists(op.dest):
+        raise FileExistsError(errno.EEXIST, "Destination exists", op.dest)
+    try:
+        if op.overwrite:
+            os.replace(op.src, op.dest)
+        else:
+            os.rename(op.src, op.dest)
+        return 0
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # Different device: copy to a temp file of our own next to the destination, then put
+    # it in place and drop the source
+    folder, name = os.path.split(op.dest)
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".partial", dir=folder)
+    os.close(fd)
+    try:
+        shutil.copy2(op.src, tmp)
+        size = os.path.getsize(tmp)
+        if op.overwrite:
+            os.replace(tmp, op.dest)
+        else:
+            _place_new(tmp, op.dest)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(op.src)
+    return size
+
+
+def _place_new(tmp, dest):
+    # Rename tmp to dest, failing with FileExistsError instead of overwriting a file that
+    # appeared during the copy. A hard link can't replace an existing name; Windows renames
+    # can't either. Filesystems without hard links (FAT, some shares) get a checked rename.
+    if os.name == "nt":
+        os.rename(tmp, dest)
+        return
+    try:
+        os.link(tmp, dest)
+    except FileExistsError:
+        raise
+    except OSError:
+        if os.path.exists(dest):
+            raise FileExistsError(errno.EEXIST, "Destination exists", dest)
+        os.rename(tmp, dest)
+        return
+    os.remove(tmp)
+
+
+class MoveExecutor:
+    # Runs planned moves grouped by (source device, destination device).
+    # Same-device moves are plain renames and run inline; cross-device moves are copies
+    # and go to a bounded thread pool per destination device.
+    # run() yields (op, error) on the calling thread as moves finish: error is None on
+    # success, the exception on failure, or CANCELLED for ops skipped after ctx.cancelled.
+    # bytes_copied counts the data cross-device moves copied during the last run().
+    def __init__(self, per_device=DEFAULT_PER_DEVICE):
+        self.per_device = per_device
+        self._dev_cache = {}
+        self.bytes_copied = 0
+        self._lock = threading.Lock()
+
+    def _device(self, folder):
+        dev = self._dev_cache.get(folder)
+        if dev is None:
+            try:
+                dev = os.stat(folder).st_dev
+            except OSError:
+                dev = -1
+            self._dev_cache[folder] = dev
+        return dev
+
+    def run(self, ctx, ops, locality=False):
+        # locality=True runs jobs grouped by destination folder instead of in plan order
+        self._dev_cache = {}
+        self.bytes_copied = 0
+        local, remote = [], {}
+        jobs = chain_jobs(ops)
+        if locality:
+            jobs = locality_order(jobs)
+        for job in jobs:
+            first = job[0]
+            src_dev = self._device(os.path.dirname(first.src))
+            dest_dev = self._device(os.path.dirname(first.dest))
+            if src_dev == dest_dev and src_dev != -1:
+                local.append(job)
+            else:
+                remote.setdefault(dest_dev, []).append(job)
+
+        results = queue.Queue()
+        outstanding = 0
+        pools = []
+
+        def run_job(job):
+            for op in job:
+                if ctx.cancelled:
+                    results.put((op, CANCELLED))
+                    continue
+                try:
+                    copied = move_one(op)
+                except Exception as e:
+                    results.put((op, e))
+                else:
+                    with self._lock:
+                        self.bytes_copied += copied
+                    results.put((op, None))
+
+        try:
+            for dev, jobs in remote.items():
+                pool = ThreadPoolExecutor(max_workers=max(1, self.per_device), thread_name_prefix=f"move-{dev}")
+                pools.append(pool)
+                for job in jobs:
+                    outstanding += len(job)
+                    pool.submit(run_job, job)
+
+            for job in local:
+                for op in job:
+                    if ctx.cancelled:
+                        yield op, CANCELLED
+                        continue
+                    try:
+                        copied = move_one(op)
+                    except Exception as e:
+                        yield op, e
+                    else:
+                        with self._lock:
+                            self.bytes_copied += copied
+                        yield op, None
+                    while True:
+                        try:
+                            item = results.get_nowait()
+                        except queue.Empty:
+                            break
+                        outstanding -= 1
+                        yield item
+
+            while outstanding:
+                item = results.get()
+                outstanding -= 1
+                yield item
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True)
+
+
+class NameCache:
+    # Names present in each folder touched by a batch, listed once and kept in step with
+    # the plan (add() for planned destinations, discard() for planned sources), so conflict
+    # and existence checks while planning are set lookups instead of stat calls.
+    # unique() remembers the last "name (n)" handed out per stem, so renaming many
+    # conflicting files into one folder doesn't re-probe n = 1, 2, 3, … each time.
+    def __init__(self):
+        self._names = {}
+        self._next = {}
+        self.listed = 0
+
+    def _listing(self, folder):
+        names = self._names.get(folder)
+        if names is None:
+            try:
+                names = {os.path.normcase(n) for n in os.listdir(folder)}
+            except OSError:
+                names = set()
+            self._names[folder] = names
+            self.listed += 1
+        return names
+
+    def exists(self, path):
+        folder, name = os.path.split(path)
+        return os.path.normcase(name) in self._listing(folder)
+
+    def add(self, path):
+        folder, name = os.path.split(path)
+        self._listing(folder).add(os.path.normcase(name))
+
+    def discard(self, path):
+        folder, name = os.path.split(path)
+        self._listing(folder).discard(os.path.normcase(name))
+
+    def unique(self, path):
+        # First free "stem (n).ext" in the folder, counting on from the last one handed out
+        stem_path, ext = os.path.splitext(path)
+        folder, stem = os.path.split(stem_path)
+        names = self._listing(folder)
+        key = (folder, stem, ext)
+        i = self._next.get(key, 1)
+        candidate = f"{stem} ({i}){ext}"
+        while os.path.normcase(candidate) in names:
+            i += 1
+            candidate = f"{stem} ({i}){ext}"
+        self._next[key] = i + 1
+        return os.path.join(folder, candidate)
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+
+from lora_sorter.index import base_roots
+from lora_sorter.moves import MoveOp, NameCache
+
+PLAN_VERSION = 1
+
+# Plan files are JSON lines, so they can be read, edited and diffed like text:
+#   {"plan": 1, "kind": "preview", "mode": "rename", "roots": ["..."], "created": "..."}
+#   {"src": "...", "dest": "...", "action": "move", "size": 123, "mtime_ns": 1700000000000000000}
+# action is "move" (no conflict when planned), "rename" (dest renamed around a conflict) or
+# "overwrite" (dest replaced). size/mtime_ns are the source file as it was when planned; a
+# move whose source is the destination of an earlier move repeats that file's values.
+# Deleting a line drops that move; a changed order changes which of two moves is planned first.
+
+
+class PlanEntry:
+    __slots__ = ("src", "dest", "action", "size", "mtime_ns")
+
+    def __init__(self, src, dest, action="move", size=None, mtime_ns=None):
+        self.src = src
+        self.dest = dest
+        self.action = action
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def as_dict(self):
+        return {"src": self.src, "dest": self.dest, "action": self.action, "size": self.size, "mtime_ns": self.mtime_ns}
+
+
+class MovePlan:
+    # A reviewed-later batch of moves: compiled from preview or orphan results without moving
+    # anything, saved, then checked against the disk again and run (see SorterEngine.execute_plan).
+    def __init__(self, kind, mode, roots=(), entries=(), created=None):
+        self.kind = kind  # "preview" or "orphans"
+        self.mode = mode  # conflict mode the plan was made with
+        self.roots = list(roots)  # base folders the plan was made from, for reference
+        self.entries = list(entries)
+        self.created = created or time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def from_ops(cls, ops, kind, mode, base_dir=None):
+        # ops: MoveOps in plan order; sources are stat'ed here so execution can tell if they changed.
+        # Paths are stored absolute, so the plan runs the same from any working directory.
+        entries = []
+        produced = {}  # dest -> entry, for moves that continue from an earlier move's destination
+        for op in ops:
+            src, dest = os.path.abspath(op.src), os.path.abspath(op.dest)
+            if op.overwrite:
+                action = "overwrite"
+            elif os.path.basename(dest) != os.path.basename(src):
+                action = "rename"
+            else:
+                action = "move"
+            origin = produced.pop(src, None)
+            if origin is not None:
+                size, mtime = origin.size, origin.mtime_ns
+            else:
+                try:
+                    st = os.stat(src)
+                    size, mtime = st.st_size, st.st_mtime_ns
+                except OSError:
+                    size = mtime = None
+            entry = PlanEntry(src, dest, action, size, mtime)
+            entries.append(entry)
+            produced[dest] = entry
+        return cls(kind, mode, base_roots(base_dir) if base_dir else (), entries)
+
+    # ---- file ----
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            header = {"plan": PLAN_VERSION, "kind": self.kind, "mode": self.mode, "roots": self.roots,
+                      "created": self.created, "moves": len(self.entries)}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for entry in self.entries:
+                f.write(json.dumps(entry.as_dict(), ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in (raw.strip() for raw in f) if line]
+        if not lines:
+            raise ValueError(f"{path} is empty")
+        header = json.loads(lines[0])
+        if header.get("plan") != PLAN_VERSION:
+            raise ValueError(f"{path} is not a move plan (or was written by a newer version)")
+        entries = []
+        for line in lines[1:]:
+            rec = json.loads(line)
+            entries.append(PlanEntry(rec["src"], rec["dest"], rec.get("action", "move"),
+                                     rec.get("size"), rec.get("mtime_ns")))
+        return cls(header.get("kind", "preview"), header.get("mode", "skip"), header.get("roots", ()), entries,
+                   header.get("created"))
+
+    # ---- checking ----
+    def validate(self):
+        # One problem per entry, None if it can still run as planned:
+        #   "missing"  source is gone (or an earlier move it continues from can't run)
+        #   "changed"  source size/mtime differ from when the plan was made
+        #   "exists"   destination appeared since, and the move wasn't planned to overwrite
+        # Existence checks use one listing per folder; only sources are stat'ed.
+        names = NameCache()
+        produced = set()
+        problems = []
+        for entry in self.entries:
+            problem = None
+            if entry.src in produced:
+                produced.discard(entry.src)
+            elif not names.exists(entry.src):
+                problem = "missing"
+            elif entry.size is not None:
+                try:
+                    st = os.stat(entry.src)
+                    if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+                        problem = "changed"
+                except OSError:
+                    problem = "missing"
+            if problem is None and entry.action != "overwrite" and names.exists(entry.dest):
+                problem = "exists"
+            if problem is None:
+                names.discard(entry.src)
+                names.add(entry.dest)
+                produced.add(entry.dest)
+            problems.append(problem)
+        return problems
+
+    def ops(self, problems):
+        # MoveOps for the entries without a problem; payload is the entry's position in the plan
+        return [MoveOp(e.src, e.dest, overwrite=e.action == "overwrite", payload=seq)
+                for seq, (e, problem) in enumerate(zip(self.entries, problems)) if problem is None]
@@ -0,0 +1,151 @@
+import os
+
+from lora_sorter.index import split_base
+from lora_sorter.safetensors_header import sort_key
+
+# Columns of the preview view: (id, heading)
+COLUMNS = (
+    ("reference", "Reference"),
+    ("sibling", "Sibling"),
+    ("extension", "Extension"),
+    ("base_model", "Base model"),
+    ("dim", "Dim"),
+    ("alpha", "Alpha"),
+    ("folder", "Target folder"),
+)
+HEADER_COLUMNS = ("base_model", "dim", "alpha")  # filled from the reference's safetensors header
+
+RECENT_QUERIES = 8  # filter results kept so backspacing is instant
+
+
+def _split(path):
+    # os.path.split without the normalisation, fast enough to run over every row
+    cut = path.rfind(os.sep)
+    if os.altsep:
+        cut = max(cut, path.rfind(os.altsep))
+    return path[:cut], path[cut + 1:]
+
+
+def _show(value):
+    if value is None:
+        return ""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class PreviewRows:
+    # Flat (reference, sibling) rows behind the preview view.
+    # Rows are stored once as two parallel lists; sorting and filtering only reorder a list of
+    # row numbers (view), and display values are built for the rows on screen, never for all.
+    # headers: {ref_file: safetensors header fields} for the header columns, optional.
+    def __init__(self, results=None, headers=None):
+        self.headers = headers or {}
+        self.refs = []
+        self.sibs = []
+        for ref_file, sibling_paths in (results or {}).items():
+            for sib in sibling_paths:
+                self.refs.append(ref_file)
+                self.sibs.append(sib)
+        self.order = list(range(len(self.sibs)))  # all rows, in the current sort order
+        self.view = self.order                    # rows that pass the filter, same order
+        self.sort_column = None
+        self.reverse = False
+        self.query = ""
+        self._keys = {}      # column -> sort key per row
+        self._search = None  # search key per row, see build_search()
+        self._recent = {}    # query -> view, for the last RECENT_QUERIES queries
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def total(self):
+        return len(self.order)
+
+    def row(self, pos):
+        # (ref_file, sibling_path) at a position in the view
+        i = self.view[pos]
+        return self.refs[i], self.sibs[i]
+
+    def rows(self):
+        return [(self.refs[i], self.sibs[i]) for i in self.view]
+
+    # ---- display ----
+    def values(self, i):
+        ref_file, sib = self.refs[i], self.sibs[i]
+        folder, name = os.path.split(sib)
+        fields = self.headers.get(ref_file) or {}
+        return (os.path.basename(ref_file), name, split_base(name)[1],
+                *(_show(fields.get(c)) for c in HEADER_COLUMNS), folder)
+
+    def window(self, start, count):
+        # Display values for view[start:start + count]
+        return [self.values(i) for i in self.view[start:start + count]]
+
+    # ---- sorting ----
+    def _key(self, column):
+        # Sort keys are built once per column, the first time it's sorted on
+        keys = self._keys.get(column)
+        if keys is None:
+            if column == "reference":
+                names = {}
+                for r in self.refs:
+                    if r not in names:
+                        names[r] = _split(r)[1].lower()
+                keys = [names[r] for r in self.refs]
+            elif column in HEADER_COLUMNS:
+                per_ref = {}
+                for r in self.refs:
+                    if r not in per_ref:
+                        per_ref[r] = sort_key(self.headers.get(r), column)
+                keys = [per_ref[r] for r in self.refs]
+            elif column == "folder":
+                keys = [_split(s)[0].lower() for s in self.sibs]
+            else:
+                names = [_split(s)[1].lower() for s in self.sibs]
+                if column == "extension":
+                    names = [n[n.find('.'):] if '.' in n else "" for n in names]
+                keys = names
+            self._keys[column] = keys
+        return keys
+
+    def sort(self, column, reverse=False):
+        keys = self._key(column)
+        self.order.sort(key=keys.__getitem__, reverse=reverse)
+        if self.view is not self.order:
+            # Stable sort of the filtered rows gives the same order as re-filtering
+            self.view.sort(key=keys.__getitem__, reverse=reverse)
+        self.sort_column = column
+        self.reverse = reverse
+        self._recent = {self.query: self.view} if self.query else {}
+
+    # ---- filtering ----
+    def build_search(self):
+        # One pre-lowered "reference name \0 sibling path" key per row. The \0 keeps a query
+        # from matching across the two fields. Built on the worker thread with the rows.
+        if self._search is None:
+            names = {}
+            for r in self.refs:
+                if r not in names:
+                    names[r] = _split(r)[1].lower() + "\0"
+            self._search = [names[r] + s.lower() for r, s in zip(self.refs, self.sibs)]
+        return self._search
+
+    def filter(self, query):
+        # Case-insensitive substring match on the reference name or the sibling path.
+        # A query that contains the previous one only has to look at the previous matches,
+        # and the last few results are kept so deleting characters again is free.
+        q = query.lower().strip()
+        if q == self.query:
+            return
+        if not q:
+            self.query, self.view = q, self.order
+            return
+        view = self._recent.get(q)
+        if view is None:
+            keys = self.build_search()
+            rows = self.view if self.query and self.query in q else self.order
+            view = [i for i in rows if q in keys[i]]
+            if len(self._recent) >= RECENT_QUERIES:
+                self._recent.pop(next(iter(self._recent)))
+            self._recent[q] = view
+        self.query, self.view = q, view
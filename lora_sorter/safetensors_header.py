@@ -0,0 +1,227 @@
+import json
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from lora_sorter.hashing import file_id
+
+# A .safetensors file starts with an 8-byte little-endian header length and a JSON header
+# (tensor names, dtypes, shapes, offsets, plus a "__metadata__" dict of strings); the tensor
+# data follows. Only those first 8 + n bytes are ever read here.
+SAFETENSORS_EXT = ".safetensors"
+MAX_HEADER = 100 << 20         # the format caps the header at 100 MB
+DEFAULT_HEADER_WORKERS = 8     # small random reads; mostly latency on network drives
+
+# Fields pulled out of a header: (field, metadata keys tried in order). kohya-ss ("ss_*")
+# and the ModelSpec ("modelspec.*") keys cover nearly every LoRA trainer in use.
+FIELDS = (
+    ("base_model", ("ss_base_model_version", "modelspec.architecture", "ss_sd_model_name")),
+    ("dim", ("ss_network_dim",)),
+    ("alpha", ("ss_network_alpha",)),
+    ("module", ("ss_network_module",)),
+    ("title", ("modelspec.title", "ss_output_name")),
+    ("trainer", ("modelspec.implementation", "ss_training_comment")),
+    ("resolution", ("ss_resolution", "modelspec.resolution")),
+    ("epochs", ("ss_num_epochs", "ss_epoch")),
+)
+NUMERIC = {"dim", "alpha", "epochs", "tensors"}
+# Fields files can be routed by (see HeaderRouter); numeric ones make poor folder keys
+HEADER_ROUTES = ("base_model", "module", "trainer")
+
+
+def read_header(path):
+    # (parsed JSON header, bytes read) for a .safetensors file, without touching the tensor
+    # data. Raises ValueError for anything that isn't a header (wrong length, not a JSON object).
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        prefix = _pread(fd, 8, 0)
+        if len(prefix) < 8:
+            raise ValueError("file too short for a safetensors header")
+        n = int.from_bytes(prefix, "little")
+        if n > MAX_HEADER or n + 8 > size:
+            raise ValueError(f"bad safetensors header length {n}")
+        header = json.loads(_pread(fd, n, 8))
+        if not isinstance(header, dict):
+            raise ValueError("safetensors header is not a JSON object")
+        return header, 8 + n
+    finally:
+        os.close(fd)
+
+
+def _pread(fd, n, offset):
+    if hasattr(os, "pread"):
+        return os.pread(fd, n, offset)
+    os.lseek(fd, offset, os.SEEK_SET)  # Windows has no pread
+    return os.read(fd, n)
+
+
+def header_fields(header):
+    # The FIELDS of one header, plus the tensor count; the network dim falls back to the
+    # rank of the first LoRA down-projection when the trainer didn't record it
+    meta = header.get("__metadata__")
+    if not isinstance(meta, dict):
+        meta = {}
+    fields = {}
+    for field, keys in FIELDS:
+        for k in keys:
+            value = meta.get(k)
+            if value not in (None, "", "None"):
+                fields[field] = _number(value) if field in NUMERIC else str(value)
+                break
+    tensors = [k for k in header if k != "__metadata__"]
+    fields["tensors"] = len(tensors)
+    if "dim" not in fields:
+        for k in tensors:
+            if k.endswith(("lora_down.weight", "lora_A.weight")):
+                info = header[k]
+                shape = info.get("shape") if isinstance(info, dict) else None
+                if isinstance(shape, list) and shape and isinstance(shape[0], int):
+                    fields["dim"] = shape[0]
+                break
+    return fields
+
+
+def _number(value):
+    try:
+        f = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(f) if f.is_integer() else f
+
+
+class HeaderReader:
+    # Header fields for many files: stat all, take what the cache still has, read the rest
+    # on a thread pool. Files that aren't readable safetensors get {} (and aren't retried
+    # until they change).
+    def __init__(self, workers=DEFAULT_HEADER_WORKERS, cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.headers_read = 0
+        self.cache_hits = 0
+        self.bytes_read = 0
+
+    def read(self, paths, check=None):
+        # {path: fields} for every .safetensors path given (others are skipped)
+        self.headers_read = self.cache_hits = self.bytes_read = 0
+        paths = [p for p in paths if p.lower().endswith(SAFETENSORS_EXT)]
+        if not paths:
+            return {}
+        pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="header")
+        fresh = []
+        try:
+            stats = dict(zip(paths, pool.map(_stat, paths)))
+            ids = {p: file_id(st) for p, st in stats.items() if st is not None}
+            known = {}
+            if self.cache is not None and ids:
+                known = self.cache.load({fid: (stats[p].st_size, stats[p].st_mtime_ns) for p, fid in ids.items()})
+            out = {}
+            todo = []
+            for p, fid in ids.items():
+                if fid in known:
+                    out[p] = known[fid]
+                    self.cache_hits += 1
+                else:
+                    todo.append(p)
+            for p, result in zip(todo, pool.map(_fields, todo)):
+                if check is not None:
+                    check()
+                fields, nbytes = result
+                out[p] = fields
+                self.headers_read += 1
+                self.bytes_read += nbytes
+                st = stats[p]
+                fresh.append((ids[p], st.st_size, st.st_mtime_ns, fields))
+            return out
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if self.cache is not None and fresh:
+                self.cache.save(fresh)
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _fields(path):
+    # (fields, header bytes read); unreadable or malformed files give ({}, 0), so one bad
+    # file never stops a run
+    try:
+        header, nbytes = read_header(path)
+        return header_fields(header), nbytes
+    except Exception:
+        return {}, 0
+
+
+def sort_key(fields, field):
+    # Sort key for one field that works across files missing it (they sort last)
+    value = fields.get(field) if fields else None
+    if value is None:
+        return (1, 0, "")
+    if isinstance(value, (int, float)):
+        return (0, value, "")
+    return (0, 0, str(value).lower())
+
+
+class HeaderRouter:
+    # Target folders by a header field: a file goes to the folder (below the roots) that
+    # already holds the most .safetensors files with the same value, e.g. where the other
+    # SDXL LoRAs live. A file's value is that of the .safetensors file in its sibling set,
+    # so a model's preview and .civitai.info go along with it.
+    def __init__(self, index, headers, field):
+        self.index = index
+        self.headers = headers  # {path: fields} for the indexed .safetensors files and the references
+        self.field = field
+        counts = defaultdict(Counter)  # value -> folder -> files
+        example = {}                   # (value, folder) -> first such file, the sibling reported
+        for path in sorted(headers):
+            value = headers[path].get(field)
+            folder = os.path.dirname(path)
+            if value is None or folder in index.roots:
+                continue
+            counts[value][folder] += 1
+            example.setdefault((value, folder), path)
+        self.targets = {}  # value -> (folder, example file)
+        for value, folders in counts.items():
+            folder = min(folders, key=lambda f: (-folders[f], f))
+            self.targets[value] = (folder, example[(value, folder)])
+
+    def value_of(self, path):
+        # The field's value for the sibling set path belongs to, or None
+        path = os.path.abspath(path)
+        fields = self.headers.get(path)
+        if fields is None or self.field not in fields:
+            folder, name = os.path.split(path)
+            for p in self.index.files_in(folder, self.index.key(name)):
+                if p in self.headers and self.field in self.headers[p]:
+                    fields = self.headers[p]
+                    break
+        return (fields or {}).get(self.field)
+
+    def siblings(self, ref_file):
+        # Like ScanIndex.siblings: [one file in the target folder], or [] if there's none or
+        # the reference is already there
+        target = self.targets.get(self.value_of(ref_file))
+        if target is None or target[0] == os.path.dirname(os.path.abspath(ref_file)):
+            return []
+        return [target[1]]
+
+    def loose_siblings(self, check=None):
+        # ScanIndex.loose_siblings by header field, counting unmatched loose files the same way
+        index = self.index
+        index.loose_unmatched = 0
+        for root in index.roots:
+            prefix = os.path.join(root, "")
+            for key, names in sorted(index.dirs.get(root, {}).items()):
+                if check is not None:
+                    check()
+                names = sorted(names)
+                siblings = self.siblings(prefix + names[0])  # the same for the whole set
+                if not siblings:
+                    index.loose_unmatched += len(names)
+                    continue
+                for name in names:
+                    yield prefix + name, list(siblings)
@@ -0,0 +1,184 @@
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from lora_sorter.hashing import file_id
+
+# Metadata files written next to a model by Civitai downloaders and the A1111/Forge extra
+# networks page. .civitai.info is the Civitai model-version API response; the plain .json
+# ones vary (A1111 user metadata, Civitai Helper, Stability Matrix) and are read leniently.
+SIDECAR_TAILS = (".civitai.info", ".civitai.json", ".cm-info.json", ".metadata.json", ".json")
+DEFAULT_SIDECAR_WORKERS = min(4, os.cpu_count() or 1)
+POOL_MIN = 5000  # fewer files than this are parsed in-process; spawning the pool costs ~0.3 s
+POOL_CHUNK = 64
+
+def is_sidecar(name):
+    return name.lower().endswith(SIDECAR_TAILS)
+
+
+def parse_sidecar(path):
+    # {model_id, version_id, model_name, type, base_model, tags} as far as the file has them;
+    # {} for files that aren't JSON objects
+    try:
+        with open(path, "rb") as f:
+            rec = json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(rec, dict):
+        return {}
+    model = rec.get("model") if isinstance(rec.get("model"), dict) else {}
+    fields = {}
+    model_id = rec.get("modelId", rec.get("model_id", model.get("id")))
+    version_id = rec.get("id") if "modelId" in rec else rec.get("modelVersionId", rec.get("version_id"))
+    for field, value in (("model_id", model_id), ("version_id", version_id)):
+        try:
+            fields[field] = int(value)
+        except (TypeError, ValueError):
+            pass
+    for field, value in (("model_name", model.get("name") or rec.get("model_name")),
+                         ("type", model.get("type") or rec.get("type")),
+                         ("base_model", rec.get("baseModel") or rec.get("sd version") or rec.get("base_model"))):
+        if isinstance(value, str) and value.strip():
+            fields[field] = value.strip()
+    tags = []
+    for tag in (rec.get("tags") or model.get("tags") or ()):
+        if isinstance(tag, dict):
+            tag = tag.get("name")
+        if isinstance(tag, str) and tag.strip():
+            tags.append(tag.strip().lower())
+    if tags:
+        fields["tags"] = sorted(set(tags))
+    return fields
+
+
+class SidecarReader:
+    # Fields for many sidecars: stat all, take what the cache still has, parse the rest.
+    # Parsing JSON holds the GIL, so big batches go to a process pool; a handful of new
+    # files (the usual case once the cache is warm) is parsed right here.
+    def __init__(self, workers=DEFAULT_SIDECAR_WORKERS, cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.parsed = 0
+        self.cache_hits = 0
+
+    def read(self, paths, check=None):
+        self.parsed = self.cache_hits = 0
+        stats = {}
+        for p in paths:
+            try:
+                stats[p] = os.stat(p)
+            except OSError:
+                pass
+        ids = {p: file_id(st) for p, st in stats.items()}
+        known = {}
+        if self.cache is not None and ids:
+            known = self.cache.load({fid: (stats[p].st_size, stats[p].st_mtime_ns) for p, fid in ids.items()})
+        out = {}
+        todo = []
+        for p, fid in ids.items():
+            if fid in known:
+                out[p] = known[fid]
+                self.cache_hits += 1
+            else:
+                todo.append(p)
+        fresh = []
+        try:
+            for p, fields in zip(todo, self._parse(todo)):
+                if check is not None:
+                    check()
+                out[p] = fields
+                self.parsed += 1
+                st = stats[p]
+                fresh.append((ids[p], st.st_size, st.st_mtime_ns, fields))
+        finally:
+            if self.cache is not None and fresh:
+                self.cache.save(fresh)
+        return out
+
+    def _parse(self, paths):
+        if self.workers <= 1 or len(paths) < POOL_MIN:
+            yield from map(parse_sidecar, paths)
+            return
+        # spawn, not fork: forking a process with live threads (the GUI, scan pools) can copy
+        # a held lock into the child and hang it
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            yield from pool.map(parse_sidecar, paths, chunksize=POOL_CHUNK)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class SidecarIndex:
+    # Sidecar fields attached to the sibling sets of a ScanIndex: a (folder, key) group is
+    # every file in one folder sharing a key, so "model 12345" means the model file, its
+    # preview, its .civitai.info and so on. Built fresh from the index for each operation
+    # (cheap once the cache is warm), so it never goes stale after moves.
+    def __init__(self, index, fields):
+        self.index = index
+        self.groups = {}                   # (folder, key) -> merged fields of its sidecars
+        self.by_model = defaultdict(set)   # model_id -> set((folder, key))
+        self.by_tag = defaultdict(set)     # tag -> set((folder, key))
+        self.by_type = defaultdict(set)    # type (lowercase) -> set((folder, key))
+        for path in sorted(fields):
+            if not fields[path]:
+                continue
+            folder, name = os.path.split(path)
+            group = (folder, index.key(name))
+            merged = self.groups.setdefault(group, {})
+            for k, v in fields[path].items():
+                merged.setdefault(k, v)
+        for group, f in self.groups.items():
+            if "model_id" in f:
+                self.by_model[f["model_id"]].add(group)
+            if "type" in f:
+                self.by_type[f["type"].lower()].add(group)
+            for tag in f.get("tags", ()):
+                self.by_tag[tag].add(group)
+
+    def fields_of(self, path):
+        # Sidecar fields of the sibling set a file belongs to, {} if it has none
+        folder, name = os.path.split(os.path.abspath(path))
+        return self.groups.get((folder, self.index.key(name)), {})
+
+    def files(self, groups):
+        return [p for folder, key in sorted(groups) for p in self.index.files_in(folder, key)]
+
+    def siblings(self, ref_file):
+        # Like ScanIndex.siblings, but by Civitai model ID: files in subfolders of the roots
+        # belonging to another sibling set of the same model (e.g. an older version under a
+        # different name). Needs a sidecar next to the reference.
+        ref_path = os.path.abspath(ref_file)
+        ref_folder = os.path.dirname(ref_path)
+        model_id = self.fields_of(ref_path).get("model_id")
+        if model_id is None:
+            return []
+        roots = self.index.roots
+        skip_tree = os.path.dirname(ref_folder) in roots
+        groups = []
+        for folder, key in self.by_model.get(model_id, ()):
+            if folder in roots or folder == ref_folder:
+                continue
+            if skip_tree and folder.startswith(ref_folder + os.sep):
+                continue
+            groups.append((folder, key))
+        return [p for p in self.files(groups) if p != ref_path]
+
+    def loose_siblings(self, check=None):
+        # ScanIndex.loose_siblings by model ID: yields (ref_file, [sibling paths]) for files
+        # directly in a root, counting the unmatched ones in index.loose_unmatched the same way
+        index = self.index
+        index.loose_unmatched = 0
+        for root in index.roots:
+            prefix = os.path.join(root, "")
+            for key, names in sorted(index.dirs.get(root, {}).items()):
+                if check is not None:
+                    check()
+                names = sorted(names)
+                siblings = self.siblings(prefix + names[0])  # the same for the whole set
+                if not siblings:
+                    index.loose_unmatched += len(names)
+                    continue
+                for name in names:
+                    yield prefix + name, list(siblings)
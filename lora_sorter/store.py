@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from lora_sorter.index import ScanIndex
+from lora_sorter.walk import DEFAULT_WORKERS, list_dir, parallel_walk
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    dir_id   INTEGER NOT NULL,
+    name     TEXT NOT NULL,
+    is_dir   INTEGER NOT NULL,
+    size     INTEGER,
+    mtime_ns INTEGER,
+    inode    INTEGER,
+    PRIMARY KEY (dir_id, name)
+) WITHOUT ROWID;
+"""
+
+
+def cache_dir():
+    # Per-user cache folder: %LOCALAPPDATA%\LoRASorter, $XDG_CACHE_HOME/lora_sorter or ~/.cache/lora_sorter
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        path = os.path.join(base, "LoRASorter")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "lora_sorter")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class FileCache:
+    # Values computed from file contents (hashes, header fields, sidecar fields) in SQLite in
+    # the user cache dir, one table per kind, keyed by (device, inode). An entry only counts
+    # while size and mtime still match, so edited files are read again. Values are stored as JSON.
+    def __init__(self, table, db_path=None):
+        self.table = table
+        self.db_path = db_path or os.path.join(cache_dir(), "files.sqlite3")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (file_id TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                     "mtime_ns INTEGER NOT NULL, value TEXT NOT NULL) WITHOUT ROWID")
+        return conn
+
+    def load(self, wanted):
+        # wanted: {file_id: (size, mtime_ns)} -> {file_id: value} for still-valid entries
+        conn = self._connect()
+        try:
+            found = {}
+            for fid, size, mtime, value in conn.execute(f"SELECT file_id, size, mtime_ns, value FROM {self.table}"):
+                if wanted.get(fid) == (size, mtime):
+                    found[fid] = json.loads(value)
+            return found
+        finally:
+            conn.close()
+
+    def save(self, rows):
+        # rows: iterable of (file_id, size, mtime_ns, value)
+        conn = self._connect()
+        try:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.table} (file_id, size, mtime_ns, value) VALUES (?, ?, ?, ?)",
+                             [(fid, size, mtime, json.dumps(value)) for fid, size, mtime, value in rows])
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class IndexStore:
+    # Persistent directory listing of one base folder (SQLite in the user cache dir).
+    # refresh() stats every folder but only re-lists the ones whose mtime changed.
+    # A folder's mtime only changes when entries are added, removed or renamed,
+    # so size/mtime of files edited in place are refreshed on the next re-list.
+    def __init__(self, root, db_path=None, workers=DEFAULT_WORKERS):
+        self.root = os.path.abspath(root)
+        self.workers = workers
+        if db_path is None:
+            key = hashlib.sha1(self.root.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+            db_path = os.path.join(cache_dir(), f"index-{key}.sqlite3")
+        self.db_path = db_path
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+        self.entries_seen = 0  # entries in re-listed folders
+        self.stat_calls = 0    # one per folder, plus one per file in re-listed folders
+
+    def _connect(self):
+        # One connection per call, so refresh() can run from any thread
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def refresh(self, check=None, trace=None):
+        # check() is called once per folder and may raise to abort; nothing is committed then.
+        # trace(msg, *args), if given, gets one line per folder.
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+        self.entries_seen = 0
+        self.stat_calls = 0
+        conn = self._connect()
+        try:
+            known = {path: (dir_id, mtime) for dir_id, path, mtime in conn.execute("SELECT id, path, mtime_ns FROM dirs")}
+            subdirs = {}
+            for dir_id, name in conn.execute("SELECT dir_id, name FROM entries WHERE is_dir = 1"):
+                subdirs.setdefault(dir_id, []).append(name)
+
+            def visit(folder):
+                # Pool thread: only reads known/subdirs, all database writes stay on this thread
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except OSError:
+                    return None, ()
+                old = known.get(folder)
+                if old is not None and old[1] == mtime:
+                    return (old, mtime, None), [os.path.join(folder, n) for n in subdirs.get(old[0], ())]
+                rows, children = self._list_dir(folder)
+                return (old, mtime, rows), children
+
+            seen = set()
+            for folder, result in parallel_walk([self.root], visit, self.workers, check):
+                if result is None:
+                    continue
+                seen.add(folder)
+                old, mtime, rows = result
+                self.stat_calls += 1
+                if rows is None:
+                    self.dirs_reused += 1
+                    if trace is not None:
+                        trace("Scanning folder: %s (unchanged)", folder)
+                    continue
+                if trace is not None:
+                    trace("Scanning folder: %s (re-listed, %d entries)", folder, len(rows))
+                if old is None:
+                    dir_id = conn.execute("INSERT INTO dirs (path, mtime_ns) VALUES (?, ?)", (folder, mtime)).lastrowid
+                else:
+                    dir_id = old[0]
+                    conn.execute("UPDATE dirs SET mtime_ns = ? WHERE id = ?", (mtime, dir_id))
+                    conn.execute("DELETE FROM entries WHERE dir_id = ?", (dir_id,))
+                conn.executemany(
+                    "INSERT INTO entries (dir_id, name, is_dir, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(dir_id,) + row for row in rows])
+                self.dirs_listed += 1
+                self.entries_seen += len(rows)
+                self.stat_calls += sum(1 for row in rows if not row[1])
+
+            gone = [(dir_id,) for path, (dir_id, _) in known.items() if path not in seen]
+            conn.executemany("DELETE FROM entries WHERE dir_id = ?", gone)
+            conn.executemany("DELETE FROM dirs WHERE id = ?", gone)
+            conn.commit()
+        finally:
+            conn.close()
+        return self
+
+    def _list_dir(self, folder):
+        files, dirs = list_dir(folder)
+        rows = [(d.name, 1, None, None, d.inode()) for d in dirs]
+        for f in files:
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            rows.append((f.name, 0, st.st_size, st.st_mtime_ns, st.st_ino))
+        return rows, [d.path for d in dirs]
+
+    def load_index(self, trace=None, index=None):
+        # index: an existing ScanIndex (e.g. one spanning several roots) to add this root's files to
+        if index is None:
+            index = ScanIndex(self.root)
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "SELECT d.path, e.name FROM entries e JOIN dirs d ON d.id = e.dir_id WHERE e.is_dir = 0")
+            if trace is None:
+                for folder, name in cur:
+                    index.add_name(folder, name)
+            else:
+                for folder, name in cur:
+                    trace("Found file: %s", os.path.join(folder, name))
+                    index.add_name(folder, name)
+            for (folder,) in conn.execute("SELECT path FROM dirs"):
+                index.dirs.setdefault(folder, {})
+        finally:
+            conn.close()
+        return index
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import os
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from lora_sorter.store import cache_dir
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow there are no thumbnails
+    Image = None
+
+AVAILABLE = Image is not None
+
+THUMB_SIZE = 48               # thumbnails fit in a THUMB_SIZE x THUMB_SIZE box
+DEFAULT_THUMB_WORKERS = 2     # decoding is CPU-bound; two keep scrolling busy without starving the GUI
+# Images shown for a row, best first: the dedicated preview files, then any image sibling
+PREVIEW_TAILS = (".preview.png", ".preview.jpg", ".preview.jpeg", ".preview.webp")
+IMAGE_TAILS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def preview_image(paths):
+    # The preview image among a reference's sibling paths, or None
+    fallback = None
+    for p in paths:
+        lower = p.lower()
+        if lower.endswith(PREVIEW_TAILS):
+            return p
+        if fallback is None and lower.endswith(IMAGE_TAILS):
+            fallback = p
+    return fallback
+
+
+class Thumbnailer:
+    # Downscales preview images with Pillow on a small thread pool. request() queues an image,
+    # and the GUI thread collects finished ones with done() as (path, kind, data):
+    #   "png"     data is PNG bytes no bigger than size x size
+    #   "failed"  unreadable or not an image; "skipped" the request was dropped by newer ones
+    # Thumbnails are cached on disk under the image's path, mtime and size, so a later session
+    # (or a changed image) never decodes an unchanged full-size PNG again.
+    def __init__(self, size=THUMB_SIZE, workers=DEFAULT_THUMB_WORKERS, disk_dir=None):
+        self.size = size
+        self.disk_dir = disk_dir or os.path.join(cache_dir(), "thumbs")
+        os.makedirs(self.disk_dir, exist_ok=True)
+        self.generation = 0  # requests from an older generation are skipped, see drop_queued()
+        self.decoded = 0
+        self.disk_hits = 0
+        self._pending = {}  # path -> generation of its latest request
+        self._done = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumb")
+
+    @property
+    def busy(self):
+        return bool(self._pending)
+
+    def request(self, path):
+        # Queues path unless it's already queued since the last drop_queued()
+        if self._pending.get(path) != self.generation:
+            self._pending[path] = self.generation
+            self._pool.submit(self._make, path, self.generation)
+
+    def drop_queued(self):
+        # Rows scrolled out of view: anything not started yet is skipped
+        self.generation += 1
+
+    def done(self):
+        out = []
+        while True:
+            try:
+                generation, path, kind, data = self._done.get_nowait()
+            except queue.Empty:
+                return out
+            if self._pending.get(path) == generation:
+                del self._pending[path]
+            if kind != "skipped":
+                out.append((path, kind, data))
+
+    def cache_file(self, path, st):
+        key = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{self.size}"
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest() + ".png")
+
+    def _save(self, cached, data):
+        # Write then rename, through a temp file of its own: the same image can be in flight
+        # on two threads after scrolling away and back, and a half-written file would stay
+        # in the cache for good
+        try:
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.disk_dir)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, cached)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _make(self, path, generation):
+        if generation != self.generation:
+            self._done.put((generation, path, "skipped", None))
+            return
+        try:
+            cached = self.cache_file(path, os.stat(path))
+            try:
+                with open(cached, "rb") as f:
+                    data = f.read()
+                self.disk_hits += 1
+                self._done.put((generation, path, "png", data))
+                return
+            except OSError:
+                pass
+            with Image.open(path) as im:
+                im.draft("RGB", (self.size, self.size))  # JPEGs decode at a fraction of full size
+                im.thumbnail((self.size, self.size))
+                if im.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                    im = im.convert("RGBA")  # e.g. CMYK JPEGs, which PNG can't hold
+                buf = io.BytesIO()
+                im.save(buf, "PNG")
+            data = buf.getvalue()
+            self.decoded += 1
+            self._save(cached, data)
+            self._done.put((generation, path, "png", data))
+        except Exception:
+            self._done.put((generation, path, "failed", None))
@@ -0,0 +1,90 @@
+import os
+import queue
+import threading
+
+# Directory listing is latency bound (one readdir round-trip per folder on SMB/NFS),
+# so many more threads than cores pay off.
+DEFAULT_WORKERS = 16
+
+
+def parallel_walk(roots, visit, workers=DEFAULT_WORKERS, check=None):
+    # Breadth-first walk on worker threads. visit(folder) runs on a worker and returns
+    # (result, child_folders); the worker queues the children for its root itself.
+    # Every root gets its own queue and workers threads, so the roots (usually separate
+    # drives) are walked at the same time and a slow one doesn't starve the others.
+    # Yields (folder, result) on the calling thread in completion order.
+    # check() is called between folders and may raise to stop the walk.
+    results = queue.SimpleQueue()
+    stop = threading.Event()
+    queues, threads = [], []
+
+    def work(todo):
+        while True:
+            folder = todo.get()
+            if folder is None or stop.is_set():
+                return
+            try:
+                result, children = visit(folder)
+                for child in children:
+                    todo.put(child)
+                results.put((folder, result, len(children), None))
+            except BaseException as e:
+                results.put((folder, None, 0, e))
+
+    try:
+        for i, root in enumerate(roots):
+            todo = queue.SimpleQueue()
+            todo.put(root)
+            queues.append(todo)
+            for n in range(max(1, workers)):
+                t = threading.Thread(target=work, args=(todo,), name=f"scan{i}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+        outstanding = len(queues)  # folders queued whose result hasn't come back yet
+        while outstanding:
+            folder, result, queued, error = results.get()
+            outstanding += queued - 1
+            if error is not None:
+                raise error
+            if check is not None:
+                check()
+            yield folder, result
+    finally:
+        stop.set()
+        for todo in queues:
+            for _ in range(max(1, workers)):
+                todo.put(None)
+        for t in threads:
+            t.join()
+
+
+def list_dir(folder):
+    # One scandir per folder; file/folder type comes from the cached DirEntry data, no stat calls.
+    # Same split as os.walk: symlinked folders are neither files nor descended into.
+    files, dirs = [], []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            dirs.append(entry)
+                    else:
+                        files.append(entry)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, dirs
+
+
+def walk_files(roots, workers=DEFAULT_WORKERS, check=None):
+    # Parallel replacement for os.walk(root) yielding (folder, [file names]);
+    # roots is one folder or a list of them, walked at the same time
+    if isinstance(roots, (str, bytes, os.PathLike)):
+        roots = [roots]
+
+    def visit(folder):
+        files, dirs = list_dir(folder)
+        return [f.name for f in files], [d.path for d in dirs]
+    return parallel_walk([os.path.abspath(r) for r in roots], visit, workers, check)
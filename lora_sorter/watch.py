@@ -0,0 +1,288 @@
+import abc
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+
+from lora_sorter.walk import list_dir
+
+# Events put on Watcher.events, all with absolute paths:
+#   ("add", file)          file created or moved into the tree
+#   ("remove", file)       file deleted or moved out of the tree
+#   ("remove_tree", dir)   folder deleted or moved away, with everything below it
+#   ("rescan", None)       events were lost (kernel queue overflow); the index needs a full refresh
+#   ("error", message)     the watcher stopped (e.g. out of inotify watches)
+POLL_INTERVAL = 2.0  # seconds between scans for the polling watcher
+
+# inotify(7)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len; the name follows
+
+
+class Watcher(abc.ABC):
+    # Background thread that reports changes below root as events on a queue.
+    # Nothing here touches the index: the owner drains events and applies them when
+    # it's safe (e.g. on the Tk thread while no scan is running).
+    # Subclasses implement _watch_loop(), which runs until self._stop is set.
+    kind = "none"
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"watch-{self.kind}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def drain(self):
+        # All events queued so far, oldest first
+        out = []
+        while True:
+            try:
+                out.append(self.events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _emit_tree(self, folder):
+        # A folder appeared: report its files (they may predate the watch) and return its subfolders
+        files, dirs = list_dir(folder)
+        for f in files:
+            self.events.put(("add", f.path))
+        return [d.path for d in dirs]
+
+    def _run(self):
+        try:
+            self._watch_loop()
+        except OSError as e:
+            self.events.put(("error", str(e)))
+
+    @abc.abstractmethod
+    def _watch_loop(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+    # Linux: one inotify watch per folder in the tree, read through ctypes
+    kind = "inotify"
+
+    def __init__(self, root):
+        super().__init__(root)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.paths = {}  # wd -> folder
+        self.wds = {}    # folder -> wd
+        # Watch the root right away so nothing created after start() is missed
+        self._watch(self.root)
+
+    def _watch(self, folder):
+        wd = self._add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            return False  # folder vanished or no access
+        self.paths[wd] = folder
+        self.wds[folder] = wd
+        return True
+
+    def _watch_tree(self, folder, report):
+        # Watch folder and everything below it; report=True also emits its files as added
+        stack = [folder]
+        while stack and not self._stop.is_set():
+            d = stack.pop()
+            if d not in self.wds and not self._watch(d):
+                continue
+            if report:
+                stack.extend(self._emit_tree(d))
+            else:
+                stack.extend(e.path for e in list_dir(d)[1])
+
+    def _unwatch_tree(self, folder):
+        prefix = folder + os.sep
+        for d in [d for d in self.wds if d == folder or d.startswith(prefix)]:
+            wd = self.wds.pop(d)
+            self.paths.pop(wd, None)
+            self._rm_watch(self.fd, wd)
+
+    def _watch_loop(self):
+        try:
+            self._watch_tree(self.root, report=False)
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(self.fd, 1 << 16)
+                except BlockingIOError:
+                    continue
+                self._handle(data)
+        finally:
+            os.close(self.fd)
+
+    def _handle(self, data):
+        pos = 0
+        while pos < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0")
+            pos += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.events.put(("rescan", None))
+                continue
+            folder = self.paths.get(wd)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                if self.wds.get(folder) == wd:
+                    del self.wds[folder]
+                continue
+            if not name:
+                continue  # *_SELF events; the parent folder reports the same change
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path, report=True)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._unwatch_tree(path)
+                    self.events.put(("remove_tree", path))
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                self.events.put(("add", path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.events.put(("remove", path))
+
+
+class PollingWatcher(Watcher):
+    # Anywhere else: stat every known folder each POLL_INTERVAL and re-list only the ones
+    # whose mtime changed (same rule as the persistent index store)
+    kind = "polling"
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        super().__init__(root)
+        self.interval = interval
+        self.folders = {}  # folder -> (mtime_ns, set(file names), set(subfolder names))
+
+    def _listing(self, folder):
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+        files, dirs = list_dir(folder)
+        return mtime, {f.name for f in files}, {d.name for d in dirs}
+
+    def _snapshot(self, folder, report=False):
+        stack = [folder]
+        while stack:
+            d = stack.pop()
+            listing = self._listing(d)
+            if listing is None:
+                continue
+            self.folders[d] = listing
+            if report:
+                for name in listing[1]:
+                    self.events.put(("add", os.path.join(d, name)))
+            stack.extend(os.path.join(d, n) for n in listing[2])
+
+    def _forget(self, folder):
+        prefix = folder + os.sep
+        for d in [d for d in self.folders if d == folder or d.startswith(prefix)]:
+            del self.folders[d]
+
+    def _watch_loop(self):
+        self._snapshot(self.root)
+        while not self._stop.wait(self.interval):
+            for folder in list(self.folders):
+                if self._stop.is_set():
+                    return
+                old = self.folders.get(folder)
+                if old is None:
+                    continue  # forgotten while this pass ran
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except OSError:
+                    continue  # gone; its parent's re-list reports it
+                if mtime == old[0]:
+                    continue
+                new = self._listing(folder)
+                if new is None:
+                    continue
+                self.folders[folder] = new
+                for name in new[1] - old[1]:
+                    self.events.put(("add", os.path.join(folder, name)))
+                for name in old[1] - new[1]:
+                    self.events.put(("remove", os.path.join(folder, name)))
+                for name in old[2] - new[2]:
+                    path = os.path.join(folder, name)
+                    self._forget(path)
+                    self.events.put(("remove_tree", path))
+                for name in new[2] - old[2]:
+                    self._snapshot(os.path.join(folder, name), report=True)
+
+
+class WatcherGroup:
+    # One watcher per base root, started, stopped and drained as one
+    def __init__(self, watchers):
+        self.watchers = watchers
+        self.kind = "+".join(sorted({w.kind for w in watchers}))
+
+    def start(self):
+        for w in self.watchers:
+            w.start()
+        return self
+
+    def stop(self):
+        for w in self.watchers:
+            w.stop()
+
+    def drain(self):
+        out = []
+        for w in self.watchers:
+            out.extend(w.drain())
+        return out
+
+
+def make_watcher(roots, poll_interval=POLL_INTERVAL, polling=False):
+    # inotify on Linux, polling everywhere else, when inotify isn't available or with polling=True.
+    # roots is one folder or a list of them; several roots give a WatcherGroup.
+    if not isinstance(roots, (str, bytes, os.PathLike)):
+        if len(roots) > 1:
+            return WatcherGroup([make_watcher(r, poll_interval, polling) for r in roots])
+        roots = roots[0]
+    if sys.platform.startswith("linux") and not polling:
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(roots, poll_interval)
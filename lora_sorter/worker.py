@@ -0,0 +1,113 @@
+import queue
+import threading
+
+
+class Cancelled(Exception):
+    pass
+
+
+class TaskContext:
+    # Handed to the task function; everything it reports goes through the queue
+    def __init__(self, post, cancel_event, writers=None):
+        self._post = post
+        self._cancel = cancel_event
+        self._writers = writers or {}
+
+    def _emit(self, kind, text):
+        # Thread-safe writers (log sinks) take lines directly instead of going through the queue
+        writer = self._writers.get(kind)
+        if writer is not None:
+            writer(text)
+        else:
+            self._post((kind, text))
+
+    def log(self, text):
+        self._emit("log", text)
+
+    def debug(self, text):
+        self._emit("debug", text)
+
+    def status(self, text):
+        self._post(("status", text))
+
+    def record(self, kind, **data):
+        # Structured copy of a log line; the GUI only shows the text, headless runs print these
+        pass
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        # Scans call this between files; moves test .cancelled and stop after the current file
+        if self._cancel.is_set():
+            raise Cancelled()
+
+
+class Worker:
+    # Runs one task at a time on a background thread. Results and log lines come
+    # back through a queue that is drained on the Tk thread with root.after.
+    def __init__(self, root, on_message, poll_ms=50, max_per_poll=500, writers=None):
+        self.root = root
+        self.on_message = on_message  # (kind, payload) -> None, called on the Tk thread
+        self.writers = writers        # kind -> thread-safe callable, bypasses the queue
+        self.poll_ms = poll_ms
+        self.max_per_poll = max_per_poll
+        self.queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._on_done = None
+        self._on_error = None
+        self._on_cancel = None
+
+    @property
+    def busy(self):
+        return self._thread is not None
+
+    def submit(self, fn, on_done=None, on_error=None, on_cancel=None):
+        if self.busy:
+            return False
+        self._cancel.clear()
+        self._on_done, self._on_error, self._on_cancel = on_done, on_error, on_cancel
+        ctx = TaskContext(self.queue.put, self._cancel, self.writers)
+        self._thread = threading.Thread(target=self._run, args=(fn, ctx), daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_ms, self._poll)
+        return True
+
+    def cancel(self):
+        if self.busy:
+            self._cancel.set()
+
+    def _run(self, fn, ctx):
+        try:
+            result = fn(ctx)
+        except Cancelled:
+            self.queue.put(("_cancelled", None))
+        except Exception as e:
+            self.queue.put(("_error", e))
+        else:
+            self.queue.put(("_done", result))
+
+    def _poll(self):
+        finished = None
+        for _ in range(self.max_per_poll):
+            try:
+                kind, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind in ("_done", "_error", "_cancelled"):
+                finished = (kind, payload)
+                break
+            self.on_message(kind, payload)
+        if finished is None:
+            self.root.after(self.poll_ms, self._poll)
+            return
+        self._thread = None
+        kind, payload = finished
+        callback = {"_done": self._on_done, "_error": self._on_error, "_cancelled": self._on_cancel}[kind]
+        if callback is not None:
+            if kind == "_cancelled":
+                callback()
+            else:
+                callback(payload)
@@ -4,6 +4,8 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from collections import defaultdict
 
+from lora_sorter.extensions import ExtensionMatcher
+
 # ------------------------------
 # LoRA Sorter – Enhanced Version
 # Features added:
@@ -275,20 +277,9 @@ class LoRASorterApp:
         else:  # skip
             return None
 
-    def _should_move_ext(self, filename, exts):
-        if exts is None:
-            return True
-        # Accept exact ext match or special token '*.preview.png' etc if provided
-        # We'll handle multi-dot extensions by comparing full tail after first dot
-        for e in exts:
-            if e.startswith('*'):
-                # treat as wildcard suffix
-                if filename.endswith(e[1:]):
-                    return True
-            else:
-                if filename.endswith(e):
-                    return True
-        return False
+    def _should_move_ext(self, filename, matcher):
+        # matcher is the ExtensionMatcher compiled once per run (matches everything if no list given)
+        return matcher.matches(filename)
 
     def run_sorter(self):
         if not self.reference_files:
@@ -306,7 +297,7 @@ class LoRASorterApp:
             messagebox.showerror("Error", "No preview results available. Run Preview first or enable Auto-confirm.")
             return
 
-        exts = self.parse_extensions()
+        matcher = ExtensionMatcher(self.parse_extensions())
         batch_moves = []  # list of (src, dest) that actually happened
         self.start_progress("Moving files…")
         try:
@@ -316,7 +307,7 @@ class LoRASorterApp:
                 # Move all related files from the ref_dir
                 for related in os.listdir(ref_dir):
                     related_name, _ = os.path.splitext(related)
-                    if related_name == ref_name and self._should_move_ext(related, exts):
+                    if related_name == ref_name and self._should_move_ext(related, matcher):
                         src_path = os.path.join(ref_dir, related)
                         dest_path = os.path.join(target_dir, related)
                         if os.path.exists(dest_path):
@@ -411,17 +402,13 @@ class LoRASorterApp:
         try:
             # Map: directory -> base_name -> set(exts present)
             dir_map = defaultdict(lambda: defaultdict(set))
+            matcher = ExtensionMatcher(exts)
             for root, _, files in os.walk(base_dir):
                 for f in files:
                     base, ext = os.path.splitext(f)
-                    # Handle multi-dot extensions by checking suffixes in exts
-                    for e in exts:
-                        if e.startswith('*'):
-                            if f.endswith(e[1:]):
-                                dir_map[root][base].add(e)
-                        else:
-                            if f.endswith(e):
-                                dir_map[root][base].add(e)
+                    # Multi-dot extensions are resolved by the matcher in one pass per file
+                    for e in matcher.match(f):
+                        dir_map[root][base].add(e)
             expected = set(exts)
             found_any = False
             for root, base_dict in dir_map.items():
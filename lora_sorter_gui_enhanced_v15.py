@@ -1,8 +1,197 @@
+import base64
 import os
-import shutil
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import filedialog, messagebox, ttk
-from collections import defaultdict
+
+from lora_sorter.engine import CONFLICT_MODES, DEFAULT_EXTENSIONS, NullContext, SorterEngine, parse_extensions
+from lora_sorter.journal import Journal
+from lora_sorter.keys import KeyRule
+from lora_sorter.logsink import LEVELS, TRACE, DebugLog, LogSink
+from lora_sorter.metrics import Metrics, write_metrics
+from lora_sorter.plan import MovePlan
+from lora_sorter.preview import COLUMNS, PreviewRows
+from lora_sorter.thumbnails import AVAILABLE as THUMBNAILS_AVAILABLE, THUMB_SIZE, Thumbnailer, preview_image
+from lora_sorter.walk import DEFAULT_WORKERS
+from lora_sorter.watch import make_watcher
+from lora_sorter.worker import Worker
+
+LOG_MAX_LINES = 5000  # lines kept in each log widget
+ROW_HEIGHT = 20       # Treeview row height in pixels, used to work out how many rows fit
+FILTER_DELAY_MS = 120  # pause in typing before the preview filter runs
+WATCH_POLL_MS = 500    # how often watch mode applies queued file changes
+METRICS_KEPT = 50      # finished operations kept for the metrics export
+THUMB_ROW_HEIGHT = THUMB_SIZE + 4  # row height while thumbnails are shown
+THUMB_POLL_MS = 50     # how often finished thumbnails are picked up
+THUMBS_KEPT = 500      # decoded thumbnails kept in memory, least recently shown dropped first
+
+
+class VirtualTable:
+    # Treeview that only ever holds the rows currently on screen. The rows live in a
+    # PreviewRows model; scrolling and paging change which slice of it is shown, so a
+    # refresh costs the same for 50 matches as for 500,000.
+    def __init__(self, parent, on_sort):
+        self.model = PreviewRows()
+        self.top = 0        # view position of the first row on screen
+        self.rows = 8       # rows that fit, updated when the widget is resized
+        self.row_height = ROW_HEIGHT
+        self.thumbs = None  # ThumbnailColumn while thumbnails are shown
+
+        self.frame = ttk.Frame(parent)
+        body = ttk.Frame(self.frame)
+        body.pack(fill="both", expand=True)
+        ids = [cid for cid, _ in COLUMNS]
+        self.tree = ttk.Treeview(body, columns=ids, show="headings", height=self.rows, selectmode="browse")
+        for cid, label in COLUMNS:
+            self.tree.heading(cid, text=label, command=lambda c=cid: on_sort(c))
+            width = 420 if cid == "folder" else 60 if cid in ("dim", "alpha") else 160
+            self.tree.column(cid, width=width, stretch=cid == "folder")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scroll = ttk.Scrollbar(body, orient="vertical", command=self._on_scroll)
+        self.scroll.pack(side="right", fill="y")
+
+        pager = ttk.Frame(self.frame)
+        pager.pack(fill="x", pady=(4,0))
+        ttk.Button(pager, text="◀ Prev", command=lambda: self.page(-1)).pack(side="left")
+        ttk.Button(pager, text="Next ▶", command=lambda: self.page(1)).pack(side="left", padx=6)
+        self.range_var = tk.StringVar(value="No rows")
+        ttk.Label(pager, textvariable=self.range_var).pack(side="left", padx=6)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Prior>", lambda e: self.page(-1))
+        self.tree.bind("<Next>", lambda e: self.page(1))
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def set_model(self, model):
+        self.model = model
+        self.top = 0
+        self.refresh()
+
+    def set_heading(self, column, text):
+        self.tree.heading(column, text=text)
+
+    def show_thumbnails(self, thumbs):
+        # thumbs: a ThumbnailColumn, or None to go back to plain text rows
+        old = self.row_height
+        self.thumbs = thumbs
+        self.row_height = THUMB_ROW_HEIGHT if thumbs is not None else ROW_HEIGHT
+        ttk.Style().configure("Treeview", rowheight=self.row_height)
+        self.tree.configure(show="tree headings" if thumbs is not None else "headings")
+        self.tree.column("#0", width=THUMB_SIZE + 16, stretch=False)
+        self.rows = max(1, self.rows * old // self.row_height)  # until the next <Configure>
+        self.refresh()
+
+    def refresh(self):
+        n = len(self.model)
+        self.top = max(0, min(self.top, n - self.rows))
+        self.tree.delete(*self.tree.get_children())
+        thumbs = self.thumbs
+        if thumbs is not None:
+            thumbs.begin(self.tree)
+        for i in self.model.view[self.top:self.top + self.rows]:
+            item = self.tree.insert("", "end", values=self.model.values(i))
+            if thumbs is not None:
+                image = thumbs.image_for(self.model.refs[i], item)
+                if image is not None:
+                    self.tree.item(item, image=image)
+        if n:
+            self.scroll.set(self.top / n, min(1.0, (self.top + self.rows) / n))
+            last = min(n, self.top + self.rows)
+            text = f"Rows {self.top + 1:,}–{last:,} of {n:,}"
+            if n != self.model.total:
+                text += f" (filtered from {self.model.total:,})"
+            self.range_var.set(text)
+        else:
+            self.scroll.set(0.0, 1.0)
+            self.range_var.set("No rows" if not self.model.total else f"No matches in {self.model.total:,} rows")
+
+    def scroll_by(self, amount, what="units"):
+        self.top += amount * (self.rows if what == "pages" else 1)
+        self.refresh()
+
+    def page(self, amount):
+        self.scroll_by(amount, "pages")
+
+    def _on_scroll(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"|"pages")
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.model))
+            self.refresh()
+        elif args[0] == "scroll":
+            self.scroll_by(int(args[1]), args[2])
+
+    def _on_resize(self, event):
+        rows = max(1, (event.height - ROW_HEIGHT) // self.row_height)  # minus the heading row
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+
+class ThumbnailColumn:
+    # Preview images in the table's tree column, made only for the rows on screen. The
+    # Thumbnailer scales them on its own threads (from its disk cache when it can); the last
+    # THUMBS_KEPT are kept here as PhotoImages, so scrolling back is free.
+    def __init__(self, root):
+        self.root = root
+        self.thumbnailer = Thumbnailer()
+        self.results = {}
+        self.sources = {}            # ref_file -> preview image path or None, looked up per row shown
+        self.images = OrderedDict()  # image path -> PhotoImage, or None if it can't be shown
+        self.waiting = {}            # image path -> tree items on screen waiting for it
+        self.tree = None
+        self._job = None
+
+    def set_results(self, results):
+        self.results = results
+        self.sources = {}
+
+    def begin(self, tree):
+        # A new set of rows is going on screen; images queued for the old ones aren't needed
+        self.tree = tree
+        self.waiting = {}
+        self.thumbnailer.drop_queued()
+
+    def image_for(self, ref_file, item):
+        # The thumbnail for a row if it's ready; otherwise it's requested and set on item later
+        path = self.sources.get(ref_file, "")
+        if path == "":
+            path = self.sources[ref_file] = preview_image(self.results.get(ref_file, ()))
+        if path is None:
+            return None
+        if path in self.images:
+            self.images.move_to_end(path)
+            return self.images[path]
+        self.waiting.setdefault(path, []).append(item)
+        self.thumbnailer.request(path)
+        if self._job is None:
+            self._job = self.root.after(THUMB_POLL_MS, self._collect)
+        return None
+
+    def _collect(self):
+        self._job = None
+        for path, kind, data in self.thumbnailer.done():
+            if path in self.images:
+                continue  # a repeated request (after scrolling) that was already under way
+            image = None
+            if kind == "png":
+                try:
+                    image = tk.PhotoImage(data=base64.b64encode(data).decode("ascii"), format="png")
+                except tk.TclError:
+                    pass
+            self.images[path] = image
+            while len(self.images) > THUMBS_KEPT:
+                self.images.popitem(last=False)
+            for item in self.waiting.pop(path, ()):
+                if image is not None and self.tree.exists(item):
+                    self.tree.item(item, image=image)
+        if self.thumbnailer.busy:
+            self._job = self.root.after(THUMB_POLL_MS, self._collect)
+
 
 class LoRASorterApp:
     def __init__(self, root):
@@ -21,6 +210,8 @@ class LoRASorterApp:
         style.configure("TCombobox", fieldbackground="#2d2d2d", foreground="white")
         style.configure("TFrame", background="#1e1e1e")
         style.configure("Horizontal.TProgressbar", troughcolor="#2d2d2d", background="#5a5a5a")
+        style.configure("Treeview", background="#252526", fieldbackground="#252526", foreground="white",
+                        rowheight=ROW_HEIGHT)
 
         self.make_menu()
 
@@ -42,18 +233,27 @@ class LoRASorterApp:
         ttk.Label(top, text="Extensions (comma-separated)").grid(row=0, column=4, sticky="w")
         self.ext_entry = ttk.Entry(top, width=45)
         self.ext_entry.grid(row=0, column=5, padx=6)
-        self.ext_entry.insert(0, ".html,.civitai.info,.json,.preview.png,.safetensors")
+        self.ext_entry.insert(0, DEFAULT_EXTENSIONS)
 
         ttk.Label(top, text="On conflict:").grid(row=0, column=6, padx=(16,4))
         self.conflict_mode = tk.StringVar(value="skip")
         self.conflict_combo = ttk.Combobox(top, textvariable=self.conflict_mode, state="readonly", width=12,
-                                           values=["skip", "overwrite", "rename"])
+                                           values=list(CONFLICT_MODES))
         self.conflict_combo.grid(row=0, column=7)
 
         self.auto_confirm = tk.BooleanVar()
         self.auto_confirm_check = ttk.Checkbutton(top, text="Auto-confirm", variable=self.auto_confirm)
         self.auto_confirm_check.grid(row=0, column=8, padx=(16,0))
 
+        ttk.Label(top, text="Scan threads:").grid(row=0, column=9, padx=(16,4))
+        self.scan_workers_var = tk.StringVar(value=str(DEFAULT_WORKERS))
+        self.scan_workers_spin = ttk.Spinbox(top, from_=1, to=64, width=4, textvariable=self.scan_workers_var)
+        self.scan_workers_spin.grid(row=0, column=10)
+
+        self.watch_var = tk.BooleanVar()
+        self.watch_check = ttk.Checkbutton(top, text="Watch", variable=self.watch_var, command=self.toggle_watch)
+        self.watch_check.grid(row=0, column=11, padx=(16,0))
+
         # ---- Action buttons ----
         actions = ttk.Frame(root)
         actions.pack(padx=16, pady=(0,8), fill="x")
@@ -73,6 +273,9 @@ class LoRASorterApp:
         self.dup_button.pack(side="left", padx=8)
         self.export_button = ttk.Button(actions, text="Export Log", command=self.export_log)
         self.export_button.pack(side="left")
+        self.cancel_button = ttk.Button(actions, text="Cancel", command=self.cancel_task)
+        self.cancel_button.pack(side="right")
+        self.cancel_button.state(["disabled"])
 
         # ---- Search & Preview list ----
         sp = ttk.Frame(root)
@@ -83,22 +286,25 @@ class LoRASorterApp:
         sr.pack(fill="x", pady=4)
         self.search_entry = ttk.Entry(sr, textvariable=self.search_var)
         self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_entry.bind("<Return>", lambda e: self.apply_filter())
         ttk.Button(sr, text="Filter", command=self.apply_filter).pack(side="left", padx=6)
         ttk.Button(sr, text="Clear", command=self.clear_filter).pack(side="left")
+        self.thumbs_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sr, text="Thumbnails", variable=self.thumbs_var,
+                        command=self.toggle_thumbnails).pack(side="left", padx=(12,0))
 
-        pv = ttk.Frame(sp)
-        pv.pack(fill="both", expand=True)
-        self.preview_list = tk.Listbox(pv, height=8, bg="#252526", fg="white")
-        self.preview_list.pack(side="left", fill="both", expand=True)
-        sb = ttk.Scrollbar(pv, orient="vertical", command=self.preview_list.yview)
-        sb.pack(side="right", fill="y")
-        self.preview_list.config(yscrollcommand=sb.set)
+        # Only the visible window of rows is ever put in the widget; click a heading to sort
+        self.preview_table = VirtualTable(sp, self.sort_preview)
+        self.preview_table.pack(fill="both", expand=True)
 
         # ---- Progress Bar ----
         prog = ttk.Frame(root)
         prog.pack(padx=16, pady=(0,8), fill="x")
         self.status_var = tk.StringVar(value="Idle")
         ttk.Label(prog, textvariable=self.status_var).pack(anchor="w")
+        # Timings and counters of the last finished operation
+        self.metrics_var = tk.StringVar(value="")
+        ttk.Label(prog, textvariable=self.metrics_var, foreground="gray").pack(anchor="w")
         self.progress = ttk.Progressbar(prog, mode="indeterminate")
         self.progress.pack(fill="x")
 
@@ -117,21 +323,65 @@ class LoRASorterApp:
 
         # Debug log
         dbg_frame = ttk.Frame(log_pane)
-        ttk.Label(dbg_frame, text="Debug Log:").pack(anchor="w")
+        dbg_head = ttk.Frame(dbg_frame)
+        dbg_head.pack(fill="x")
+        ttk.Label(dbg_head, text="Debug Log:").pack(side="left")
+        self.debug_level = tk.StringVar(value="info")
+        self.debug_level_combo = ttk.Combobox(dbg_head, textvariable=self.debug_level, state="readonly", width=8,
+                                              values=list(LEVELS))
+        self.debug_level_combo.pack(side="right")
+        ttk.Label(dbg_head, text="Level:").pack(side="right", padx=(0,4))
         self.debug_log = tk.Text(dbg_frame, wrap="word", bg="#181818", fg="#c0ff80", insertbackground="#c0ff80", width=80)
         self.debug_log.pack(fill="both", expand=True)
         log_pane.add(dbg_frame, weight=2)
 
+        # Lines are buffered and flushed in batches; the widgets only keep the newest
+        # LOG_MAX_LINES lines, the full history stays in a session file for Export Log.
+        self.log_sink = LogSink(root, self.log, "main", max_lines=LOG_MAX_LINES)
+        self.metrics_history = []  # Metrics of finished operations, oldest first
+        self._log_flush_mark = (0.0, 0)
+        self.debug_sink = LogSink(root, self.debug_log, "debug", max_lines=LOG_MAX_LINES)
+        # off/info/debug go to the debug pane, trace goes to a rotating trace.log in the cache dir
+        self.dlog = DebugLog(self.debug_sink)
+        self.debug_level.trace_add("write", lambda *_: self._debug_level_changed())
+
         # ---- Internal state ----
         self.reference_files = []
         self.preview_results = {}  # ref_file -> list of sibling file paths
-        self.filtered_preview_items = []
+        self.preview_headers = {}  # ref_file -> safetensors header fields, for the preview columns
+        self.preview_rows = self.preview_table.model  # flat rows behind the preview table
+        self.thumbnails = None  # ThumbnailColumn, made the first time thumbnails are switched on
+        self._filter_job = None
+        # The filter runs as you type, once typing pauses for FILTER_DELAY_MS
+        self.search_var.trace_add("write", lambda *_: self._schedule_filter())
         self.base_dir = None
+        self.extra_roots = []  # more base folders (e.g. other drives) searched together with base_dir
 
-        self.history = []
-        self.redo_stack = []
+        # Sorting logic, the shared base folder index and the undo/redo history live in the engine;
+        # engine.workers is read from the spinbox on the Tk thread before each task
+        self.engine = SorterEngine(dlog=self.dlog, journal=Journal())
+        undo_count, redo_count = self.engine.recover_history()
+        if undo_count or redo_count:
+            self.log_line(f"Recovered undo history: {undo_count} batch(es) to undo, {redo_count} to redo.")
 
         self.orphan_map = {} # base_name -> { 'orphan': [file_in_base], 'siblings': [files_in_subfolders] }
+        self.watcher = None  # watch.Watcher while watch mode is on
+        self._watch_after = None  # pending _poll_watch timer
+
+        # Scans and moves run off the Tk thread; log lines and results come back via root.after
+        self.worker = Worker(root, self._on_worker_message,
+                             writers={"log": self.log_sink.write, "debug": self.debug_log_line})
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        # Closes the session logs and the journal (releasing their locks) before the window
+        # goes. A move still running keeps its journal open until it ends with the process.
+        self.stop_watch()
+        self.log_sink.close()
+        self.debug_sink.close()
+        if not self.worker.busy:
+            self.engine.journal.close()
+        self.root.destroy()
 
     # ------------------------------ UI helpers ------------------------------
     def make_menu(self):
@@ -139,12 +389,17 @@ class LoRASorterApp:
         filem = tk.Menu(menubar, tearoff=0)
         filem.add_command(label="Choose Reference Files", command=self.choose_files)
         filem.add_command(label="Set Base Folder", command=self.set_base_folder)
+        filem.add_command(label="Add Base Folder…", command=self.add_base_folder)
         filem.add_command(label="Preview Matches", command=self.preview_matches)
+        filem.add_command(label="Preview All Loose Files", command=self.preview_loose)
         filem.add_command(label="Move Files", command=self.run_sorter)
         filem.add_separator()
+        filem.add_command(label="Save Move Plan…", command=self.save_move_plan)
+        filem.add_command(label="Run Move Plan…", command=self.run_move_plan)
+        filem.add_separator()
         filem.add_command(label="Export Log", command=self.export_log)
         filem.add_separator()
-        filem.add_command(label="Exit", command=self.root.quit)
+        filem.add_command(label="Exit", command=self.on_close)
         menubar.add_cascade(label="File", menu=filem)
 
         editm = tk.Menu(menubar, tearoff=0)
@@ -155,31 +410,50 @@ class LoRASorterApp:
         toolsm = tk.Menu(menubar, tearoff=0)
         toolsm.add_command(label="Orphan Finder", command=self.orphan_finder)
         toolsm.add_command(label="Move Orphans to Sibling Folder", command=self.move_orphans_to_sibling)
+        toolsm.add_command(label="Save Orphan Move Plan…", command=self.save_orphan_plan)
         toolsm.add_command(label="Duplicate Detector", command=self.duplicate_detector)
+        toolsm.add_command(label="Find Identical Files (content)", command=self.identical_detector)
+        toolsm.add_separator()
+        toolsm.add_command(label="Refresh Index", command=self.refresh_index)
         menubar.add_cascade(label="Tools", menu=toolsm)
 
+        # Looser sibling rules; the index is rebuilt with the new rule on the next scan
+        matchm = tk.Menu(menubar, tearoff=0)
+        self.match_vars = {step: tk.BooleanVar() for step in ("case", "separators", "version")}
+        matchm.add_checkbutton(label="Ignore case", variable=self.match_vars["case"])
+        matchm.add_checkbutton(label="Ignore separators ( _ - . space )", variable=self.match_vars["separators"])
+        matchm.add_checkbutton(label="Ignore version tags (_v2)", variable=self.match_vars["version"])
+        matchm.add_separator()
+        self.dots_var = tk.StringVar(value="first")
+        matchm.add_radiobutton(label="Base name ends at the first dot", variable=self.dots_var, value="first")
+        matchm.add_radiobutton(label="Base name ends at the last dot", variable=self.dots_var, value="last")
+        matchm.add_radiobutton(label="Strip known extensions (.preview.png, .civitai.info, …)",
+                               variable=self.dots_var, value="known")
+        matchm.add_separator()
+        # Preview targets: folders with the same base name, with the same Civitai model (read
+        # from .civitai.info/.json files, so renamed versions are found too), or the folder
+        # holding most LoRAs of the same base model (from the safetensors headers)
+        self.route_var = tk.StringVar(value="name")
+        matchm.add_radiobutton(label="Find target folders by name", variable=self.route_var, value="name")
+        matchm.add_radiobutton(label="Find target folders by Civitai model ID", variable=self.route_var, value="model")
+        matchm.add_radiobutton(label="Find target folders by base model", variable=self.route_var, value="base_model")
+        menubar.add_cascade(label="Matching", menu=matchm)
+
         self.root.config(menu=menubar)
 
     def log_line(self, text):
-        self.log.insert(tk.END, text + "\n")
-        self.log.see(tk.END)
+        self.log_sink.write(text)
 
     def debug_log_line(self, text):
-        self.debug_log.insert(tk.END, text + "\n")
-        self.debug_log.see(tk.END)
+        self.dlog.info(text)
+
+    def _debug_level_changed(self):
+        self.dlog.set_level(self.debug_level.get())
+        if self.dlog.enabled(TRACE):
+            self.log_line(f"Trace logging to: {self.dlog.trace_path}")
 
     def parse_extensions(self):
-        raw = self.ext_entry.get().strip()
-        if not raw:
-            return None  # None means move all related files regardless of extension
-        parts = [p.strip() for p in raw.split(',') if p.strip()]
-        exts = set()
-        for p in parts:
-            if p.startswith('.') or p.startswith('*'):
-                exts.add(p)
-            else:
-                exts.add('.' + p)
-        return exts
+        return parse_extensions(self.ext_entry.get())
 
     def pick_base_dir(self):
         if not self.base_dir:
@@ -190,13 +464,67 @@ class LoRASorterApp:
             self.base_folder_var.set(self.base_dir)
         return self.base_dir
 
+    def base_roots(self):
+        # Every base folder to search, the one picked with Set Base Folder first
+        base_dir = self.base_dir if self.base_dir else self.pick_base_dir()
+        if not base_dir:
+            return None
+        return [base_dir] + self.extra_roots
+
+    def _show_base_folders(self):
+        extra = f" (+{len(self.extra_roots)} more)" if self.extra_roots else ""
+        self.base_folder_var.set(f"{self.base_dir}{extra}")
+
     def set_base_folder(self):
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return
         bd = filedialog.askdirectory(title="Select Base Folder to Search")
         if bd:
+            if self.watcher is not None:
+                self.stop_watch()
+                self.log_line("Watch mode stopped (base folder changed).")
             self.base_dir = bd
+            self.extra_roots = []
             self.base_folder_var.set(self.base_dir)
+            self.engine.drop_index()
             self.log_line(f"Base folder set to: {self.base_dir}")
 
+    def add_base_folder(self):
+        # Another root searched in the same pass; its subfolders hold siblings and its own
+        # files count as references/orphans just like the main base folder's
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return
+        if not self.pick_base_dir():
+            return
+        bd = filedialog.askdirectory(title="Add Another Base Folder")
+        if not bd:
+            return
+        if os.path.abspath(bd) in map(os.path.abspath, [self.base_dir] + self.extra_roots):
+            self.log_line(f"Already a base folder: {bd}")
+            return
+        if self.watcher is not None:
+            self.stop_watch()
+            self.log_line("Watch mode stopped (base folders changed).")
+        self.extra_roots.append(bd)
+        self._show_base_folders()
+        self.engine.drop_index()
+        self.log_line(f"Base folder added: {bd} ({len(self.extra_roots) + 1} base folders)")
+
+    def refresh_index(self):
+        roots = self.base_roots()
+        if not roots:
+            return
+
+        def work(ctx):
+            return self.engine.ensure_index(ctx, roots, refresh=True)
+
+        def done(index):
+            self.log_line(f"Index refreshed: {index.file_count} files in {len(index.dirs)} folders.")
+
+        self.run_task("Indexing base folder…", work, done, "Index ready")
+
     def start_progress(self, msg="Working..."):
         self.status_var.set(msg)
         self.progress.start(10)
@@ -207,41 +535,120 @@ class LoRASorterApp:
         self.status_var.set(msg)
         self.root.update_idletasks()
 
-    def update_preview_list(self):
-        self.preview_list.delete(0, tk.END)
-        for ref_file, sibling_paths in self.preview_results.items():
-            for sib in sibling_paths:
-                item = f"{os.path.basename(ref_file)}  →  {sib}"
-                self.preview_list.insert(tk.END, item)
-        self.filtered_preview_items = [
-            (ref_file, sib)
-            for ref_file, sibling_paths in self.preview_results.items()
-            for sib in sibling_paths
-        ]
+    # ------------------------------ Background tasks ------------------------------
+    def run_task(self, msg, work, on_done, done_msg="Done", on_error=None):
+        # work(ctx) runs on the worker thread and must not touch Tk widgets or variables;
+        # on_done(result) runs back on the Tk thread once it returns, on_error(exception)
+        # if it raised instead.
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return False
+
+        def done(result):
+            self.task_finished(done_msg)
+            on_done(result)
+
+        def failed(e):
+            self.task_finished("Failed")
+            self.log_line(f"Error: {e}")
+            if on_error is not None:
+                on_error(e)
+
+        def cancelled():
+            self.task_finished("Cancelled")
+            self.log_line("Operation cancelled.")
+
+        try:
+            self.engine.workers = max(1, int(self.scan_workers_var.get()))
+        except ValueError:
+            self.engine.workers = DEFAULT_WORKERS
+        self.engine.keys = KeyRule([step for step, var in self.match_vars.items() if var.get()], self.dots_var.get())
+        # Without watch mode nothing tells the index about new downloads: re-check folder mtimes
+        self.engine.index_stale = self.watcher is None
+        self.engine.metrics = Metrics(msg.rstrip("….").strip())
+        self._log_flush_mark = (self.log_sink.flush_seconds, self.log_sink.lines_flushed)
+        self.start_progress(msg)
+        self.cancel_button.state(["!disabled"])
+        self.worker.submit(work, on_done=done, on_error=failed, on_cancel=cancelled)
+        return True
+
+    def task_finished(self, msg):
+        self.cancel_button.state(["disabled"])
+        self.stop_progress(msg)
+        self.finish_metrics(msg)
+
+    def finish_metrics(self, outcome):
+        # Tk log inserts happen on timer ticks, so they're counted as the difference over the task
+        m = self.engine.metrics.finish()
+        seconds, lines = self._log_flush_mark
+        if self.log_sink.lines_flushed > lines:
+            m.add_time("log", self.log_sink.flush_seconds - seconds)
+            m.count("log_lines", self.log_sink.lines_flushed - lines)
+        m.outcome = outcome
+        self.metrics_history.append(m)
+        del self.metrics_history[:-METRICS_KEPT]
+        self.metrics_var.set(f"{m.name}: {m.summary()}")
+
+    def cancel_task(self):
+        if self.worker.busy:
+            self.status_var.set("Cancelling…")
+            self.worker.cancel()
+
+    def _on_worker_message(self, kind, payload):
+        if kind == "log":
+            self.log_line(payload)
+        elif kind == "debug":
+            self.debug_log_line(payload)
+        elif kind == "status":
+            self.status_var.set(payload)
+
+    def update_preview_list(self, rows=None):
+        self.preview_rows = rows if rows is not None else PreviewRows(self.preview_results, self.preview_headers)
+        if self.thumbnails is not None:
+            self.thumbnails.set_results(self.preview_results)
+        self.preview_rows.filter(self.search_var.get())
+        for cid, label in COLUMNS:
+            self.preview_table.set_heading(cid, label)
+        self.preview_table.set_model(self.preview_rows)
+
+    def toggle_thumbnails(self):
+        if self.thumbs_var.get() and not THUMBNAILS_AVAILABLE:
+            # Without Pillow the images would have to be decoded on the Tk thread, which
+            # stalls scrolling; better no thumbnails than a frozen list
+            self.thumbs_var.set(False)
+            self.status_var.set("Thumbnails need Pillow: pip install pillow")
+            self.log_line("Thumbnails need Pillow (pip install pillow).")
+            return
+        if self.thumbs_var.get():
+            if self.thumbnails is None:
+                self.thumbnails = ThumbnailColumn(self.root)
+            self.thumbnails.set_results(self.preview_results)
+            self.preview_table.show_thumbnails(self.thumbnails)
+        else:
+            self.preview_table.show_thumbnails(None)
+
+    def sort_preview(self, column):
+        # First click sorts ascending, clicking the same heading again flips the order
+        rows = self.preview_rows
+        reverse = rows.sort_column == column and not rows.reverse
+        rows.sort(column, reverse)
+        for cid, label in COLUMNS:
+            if cid == column:
+                label += " ▼" if reverse else " ▲"
+            self.preview_table.set_heading(cid, label)
+        self.preview_table.set_model(rows)
+
+    def _schedule_filter(self):
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
 
     def apply_filter(self):
-        q = self.search_var.get().lower().strip()
-        self.preview_list.delete(0, tk.END)
-        if not q:
-            for ref_file, sibling_paths in self.preview_results.items():
-                for sib in sibling_paths:
-                    self.preview_list.insert(tk.END, f"{os.path.basename(ref_file)}  →  {sib}")
-            self.filtered_preview_items = [
-                (ref_file, sib)
-                for ref_file, sibling_paths in self.preview_results.items()
-                for sib in sibling_paths
-            ]
-            return
-        filt = []
-        for ref_file, sibling_paths in self.preview_results.items():
-            for sib in sibling_paths:
-                name = os.path.basename(ref_file).lower()
-                sib_path = sib.lower()
-                if q in name or q in sib_path:
-                    filt.append((ref_file, sib))
-        self.filtered_preview_items = filt
-        for ref_file, sib in filt:
-            self.preview_list.insert(tk.END, f"{os.path.basename(ref_file)}  →  {sib}")
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+            self._filter_job = None
+        self.preview_rows.filter(self.search_var.get())
+        self.preview_table.set_model(self.preview_rows)
 
     def clear_filter(self):
         self.search_var.set("")
@@ -254,82 +661,93 @@ class LoRASorterApp:
             self.reference_files = list(files)
             self.log_line(f"Selected {len(files)} reference files.")
 
-    def preview_matches(self):
+    def preview_matches(self, then=None):
         if not self.reference_files:
             messagebox.showerror("Error", "No reference files selected.")
             return
-        base_dir = self.base_dir if self.base_dir else self.pick_base_dir()
-        if not base_dir:
+        roots = self.base_roots()
+        if not roots:
+            return
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
             return
 
+        refs = list(self.reference_files)
+        route = self.route_var.get()
         self.preview_results = {}
         self.log_line("--- Previewing Sibling Matches ---")
         self.debug_log_line("--- [DEBUG] Previewing Sibling Matches ---")
-        self.start_progress("Scanning subfolders…")
 
-        try:
-            for ref_file in self.reference_files:
-                ref_basename = os.path.basename(ref_file).split('.')[0]
-                ref_path = os.path.abspath(ref_file)
-                ref_folder = os.path.abspath(os.path.dirname(ref_file))
-                self.debug_log_line(f"[DEBUG] Reference file: {ref_file}")
-                self.debug_log_line(f"[DEBUG] Reference base name for match: {ref_basename}")
-                self.debug_log_line(f"[DEBUG] Reference folder (to skip): {ref_folder}")
-                sibling_files = []
-                # Only walk subfolders, not base folder itself
-                for entry in os.scandir(base_dir):
-                    if entry.is_dir():
-                        folder_path = os.path.abspath(entry.path)
-                        self.debug_log_line(f"[DEBUG] Scanning folder: {folder_path}")
-                        if folder_path == ref_folder:
-                            self.debug_log_line(f"[DEBUG] Skipping reference folder: {folder_path}")
-                            continue
-                        for root, _, files in os.walk(folder_path):
-                            for file in files:
-                                file_basename = file.split('.')[0]
-                                candidate_path = os.path.abspath(os.path.join(root, file))
-                                self.debug_log_line(f"[DEBUG] Found file: {candidate_path} (basename: {file_basename})")
-                                if file_basename == ref_basename:
-                                    if candidate_path != ref_path:
-                                        self.debug_log_line(f"[DEBUG] Sibling match: {candidate_path}")
-                                        sibling_files.append(candidate_path)
-                                    else:
-                                        self.debug_log_line(f"[DEBUG] Skipped (is reference file itself): {candidate_path}")
-                                else:
-                                    self.debug_log_line(f"[DEBUG] Skipped (base mismatch): {candidate_path}")
+        def work(ctx):
+            results = {}
+            for ref_file, sibling_files in self.engine.iter_preview(ctx, roots, refs, route):
                 if sibling_files:
-                    self.preview_results[ref_file] = sibling_files
+                    results[ref_file] = sibling_files
                     for sib in sibling_files:
-                        self.log_line(f"Sibling found: {os.path.basename(ref_file)} -> {sib}")
+                        ctx.log(f"Sibling found: {os.path.basename(ref_file)} -> {sib}")
                 else:
-                    self.log_line(f"No siblings found for {os.path.basename(ref_file)}")
-        finally:
-            self.stop_progress("Preview ready")
+                    ctx.log(f"No siblings found for {os.path.basename(ref_file)}")
+            # All references, so ones that gain siblings while watching have their columns too
+            headers = self.engine.read_headers(ctx, refs)
+            # Flatten and index the rows for the preview table here, off the Tk thread
+            rows = PreviewRows(results, headers)
+            rows.build_search()
+            return results, headers, rows
 
-        if not self.preview_results:
-            self.log_line("No siblings found for any reference files.")
-        else:
-            self.log_line("Preview complete. Use 'Move Files' to confirm.")
-        self.update_preview_list()
+        def done(result):
+            results, self.preview_headers, rows = result
+            self.preview_results = results
+            if not self.preview_results:
+                self.log_line("No siblings found for any reference files.")
+            else:
+                self.log_line("Preview complete. Use 'Move Files' to confirm.")
+            self.update_preview_list(rows)
+            if then is not None:
+                then()
 
-    def _resolve_conflict(self, dest_path):
-        mode = self.conflict_mode.get()
-        if mode == "overwrite":
-            try:
-                os.remove(dest_path)
-            except FileNotFoundError:
-                pass
-            return dest_path
-        elif mode == "rename":
-            base, ext = os.path.splitext(dest_path)
-            i = 1
-            candidate = f"{base} ({i}){ext}"
-            while os.path.exists(candidate):
-                i += 1
-                candidate = f"{base} ({i}){ext}"
-            return candidate
-        else:  # skip
-            return None
+        self.run_task("Scanning subfolders…", work, done, "Preview ready")
+
+    def preview_loose(self):
+        # Every file sitting directly in the base folder(s) becomes a reference, matched in one
+        # pass over the index; afterwards Move Files works on them like on chosen files
+        roots = self.base_roots()
+        if not roots:
+            return
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return
+        route = self.route_var.get()
+        self.preview_results = {}
+        self.log_line("--- Previewing All Loose Files ---")
+
+        def work(ctx):
+            results = {}
+            for ref_file, sibling_files in self.engine.iter_loose(ctx, roots, route):
+                results[ref_file] = sibling_files
+                if len(results) % 1000 == 0:
+                    ctx.status(f"Matching loose files… {len(results)} with siblings")
+            ctx.log(f"{len(results)} loose file(s) have siblings, "
+                    f"{self.engine.index.loose_unmatched} have none.")
+            headers = self.engine.read_headers(ctx, list(results))
+            rows = PreviewRows(results, headers)
+            rows.build_search()
+            return results, headers, rows
+
+        def done(result):
+            results, self.preview_headers, rows = result
+            self.preview_results = results
+            self.reference_files = list(results)
+            self.log_line("Preview complete. Use 'Move Files' to confirm." if results
+                          else "No loose files with siblings found.")
+            self.update_preview_list(rows)
+
+        self.run_task("Matching loose files…", work, done, "Preview ready")
+
+    def _record_batch(self, batch_moves, done_msg, empty_msg):
+        if self.engine.record_batch(batch_moves):
+            self.log_line(done_msg)
+        else:
+            self.log_line(empty_msg)
 
     def run_sorter(self):
         # Move only the reference file to each sibling's folder
@@ -341,230 +759,284 @@ class LoRASorterApp:
             base_dir = self.base_dir if self.base_dir else self.pick_base_dir()
             if not base_dir:
                 return
-            self.preview_matches()
+            self.preview_matches(then=self._move_preview_results)
+            return
+        self._move_preview_results()
 
+    def _move_preview_results(self):
         if not self.preview_results:
             messagebox.showerror("Error", "No preview results available. Run Preview first or enable Auto-confirm.")
             return
 
-        batch_moves = []  # list of (src, dest) that actually happened
-        self.start_progress("Moving files…")
-        try:
-            for ref_file, sibling_paths in self.preview_results.items():
-                ref_basename = os.path.basename(ref_file)
-                ref_path = os.path.abspath(ref_file)
-                for sib_path in sibling_paths:
-                    target_dir = os.path.dirname(sib_path)
-                    dest_path = os.path.join(target_dir, ref_basename)
-                    if ref_path == os.path.abspath(dest_path):
-                        self.log_line(f"Skipped {ref_basename} (already in {target_dir})")
-                        continue
-                    if os.path.exists(dest_path):
-                        new_dest = self._resolve_conflict(dest_path)
-                        if new_dest is None:
-                            self.log_line(f"Skipped {ref_basename} (exists in {target_dir})")
-                            continue
-                        else:
-                            dest_path = new_dest
-                    shutil.move(ref_file, dest_path)
-                    self.log_line(f"Moved {ref_basename} → {target_dir}")
-                    batch_moves.append((dest_path, ref_file))
-                    # After moving, update ref_file to the new location for undo/redo
-                    ref_file = dest_path
-                    ref_path = os.path.abspath(ref_file)
-        finally:
-            self.stop_progress("Move complete")
-
-        if batch_moves:
-            self.history.append(batch_moves)
-            self.redo_stack.clear()
-            self.log_line("--- File moving complete ---")
-        else:
-            self.log_line("No files moved.")
+        items = list(self.preview_results.items())
+        mode = self.conflict_mode.get()
+
+        def done(batch_moves):
+            self._record_batch(batch_moves, "--- File moving complete ---", "No files moved.")
+
+        self.run_task("Moving files…", lambda ctx: self.engine.move_preview(ctx, items, mode), done, "Move complete")
+
+    # ------------------------------ Move plans ------------------------------
+    def save_move_plan(self):
+        if not self.preview_results:
+            messagebox.showerror("Error", "No preview results available. Run Preview first.")
+            return
+        self._save_plan("preview", list(self.preview_results.items()))
+
+    def save_orphan_plan(self):
+        if not self.orphan_map:
+            messagebox.showinfo("Move Orphans", "No orphan mapping found. Run Orphan Finder first.")
+            return
+        self._save_plan("orphans", list(self.orphan_map.items()))
+
+    def _save_plan(self, kind, items):
+        # Plans the moves without running them; Run Move Plan checks them against the disk again
+        path = filedialog.asksaveasfilename(defaultextension=".jsonl", filetypes=[("Move Plans", "*.jsonl")])
+        if not path:
+            return
+        mode = self.conflict_mode.get()
+        roots = self.base_roots()
+
+        def work(ctx):
+            plan = self.engine.compile_plan(ctx, kind, items, mode, roots)
+            plan.save(path)
+            return plan
+
+        def done(plan):
+            self.log_line(f"Plan with {len(plan)} move(s) saved to: {path}")
+
+        self.run_task("Planning moves…", work, done, "Plan saved")
+
+    def run_move_plan(self):
+        path = filedialog.askopenfilename(title="Select Move Plan", filetypes=[("Move Plans", "*.jsonl")])
+        if not path:
+            return
+        self.log_line(f"--- Move plan: {path} ---")
+
+        def done(batch_moves):
+            self._record_batch(batch_moves, "--- Move plan complete ---", "No files moved.")
+
+        self.run_task("Running move plan…", lambda ctx: self.engine.execute_plan(ctx, MovePlan.load(path)),
+                      done, "Move plan complete")
 
     # ------------------------------ Undo/Redo ------------------------------
     def undo_last(self):
-        if not self.history:
+        if not self.engine.history:
             self.log_line("Nothing to undo.")
             return
-        batch = self.history.pop()
-        undone = []
-        self.start_progress("Undoing last batch…")
-        try:
-            for current_path, original_path in reversed(batch):
-                if not os.path.exists(current_path):
-                    self.log_line(f"Missing file (cannot undo): {current_path}")
-                    continue
-                if os.path.exists(original_path):
-                    new_dest = self._resolve_conflict(original_path)
-                    if new_dest is None:
-                        self.log_line(f"Undo skipped (exists): {os.path.basename(original_path)}")
-                        continue
-                    else:
-                        original_path = new_dest
-                shutil.move(current_path, original_path)
-                undone.append((original_path, current_path))
-                self.log_line(f"Restored {os.path.basename(original_path)}")
-        finally:
-            self.stop_progress("Undo complete")
-        if undone:
-            self.redo_stack.append(undone)
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return
+        batch = self.engine.take_undo()
+        mode = self.conflict_mode.get()
+        # The batch is off the stack while it runs; if the run fails, what's left of it goes back
+        self.run_task("Undoing last batch…", lambda ctx: self.engine.replay_batch(ctx, batch, mode, "undo", "Restored"),
+                      self.engine.finish_undo, "Undo complete",
+                      on_error=lambda e: self.engine.finish_undo(self.engine.salvage_replay(batch)))
 
     def redo_last(self):
-        if not self.redo_stack:
+        if not self.engine.redo_stack:
             self.log_line("Nothing to redo.")
             return
-        batch = self.redo_stack.pop()
-        redone = []
-        self.start_progress("Redoing…")
-        try:
-            for current_path, original_path in reversed(batch):
-                if not os.path.exists(current_path):
-                    self.log_line(f"Missing file (cannot redo): {current_path}")
-                    continue
-                if os.path.exists(original_path):
-                    new_dest = self._resolve_conflict(original_path)
-                    if new_dest is None:
-                        self.log_line(f"Redo skipped (exists): {os.path.basename(original_path)}")
-                        continue
-                    else:
-                        original_path = new_dest
-                shutil.move(current_path, original_path)
-                redone.append((original_path, current_path))
-                self.log_line(f"Re-moved {os.path.basename(original_path)}")
-        finally:
-            self.stop_progress("Redo complete")
-        if redone:
-            self.history.append(redone)
+        if self.worker.busy:
+            self.log_line("Another operation is still running.")
+            return
+        batch = self.engine.take_redo()
+        mode = self.conflict_mode.get()
+        self.run_task("Redoing…", lambda ctx: self.engine.replay_batch(ctx, batch, mode, "redo", "Re-moved"),
+                      self.engine.finish_redo, "Redo complete",
+                      on_error=lambda e: self.engine.finish_redo(self.engine.salvage_replay(batch)))
 
     # ------------------------------ Tools ------------------------------
     def orphan_finder(self):
         # Find orphans and store mapping for Move Orphans tool
-        base_dir = self.base_dir if self.base_dir else self.pick_base_dir()
-        if not base_dir:
+        roots = self.base_roots()
+        if not roots:
             return
         exts = self.parse_extensions()
         if not exts:
             messagebox.showinfo("Orphan Finder", "Please specify the extensions list to check for orphans.")
             return
         self.log_line("--- Orphan Finder ---")
-        self.start_progress("Scanning for orphans…")
-        self.orphan_map = defaultdict(lambda: {'orphan': [], 'siblings': []})
-        try:
-            # Map: base_name -> set(exts present) for each folder
-            folder_map = defaultdict(lambda: defaultdict(set))
-            for root, _, files in os.walk(base_dir):
-                for f in files:
-                    base, ext = os.path.splitext(f)
-                    for e in exts:
-                        if e.startswith('*'):
-                            if f.endswith(e[1:]):
-                                folder_map[root][base].add(e)
-                        else:
-                            if f.endswith(e):
-                                folder_map[root][base].add(e)
-            expected = set(exts)
-            found_any = False
-            # Find orphans in base folder only
-            for base, have in folder_map[base_dir].items():
-                missing = expected - have
-                if missing:
-                    found_any = True
-                    self.log_line(f"Orphan: {base} in {base_dir} missing {sorted(missing)}")
-                    # Find actual orphan files
-                    for e in have:
-                        for f in os.listdir(base_dir):
-                            if f.startswith(base) and (f.endswith(e[1:]) if e.startswith('*') else f.endswith(e)):
-                                self.orphan_map[base]['orphan'].append(os.path.join(base_dir, f))
-                    # Find siblings in subfolders
-                    for folder in folder_map:
-                        if folder == base_dir:
-                            continue
-                        if base in folder_map[folder]:
-                            for e2 in folder_map[folder][base]:
-                                for f in os.listdir(folder):
-                                    if f.startswith(base) and (f.endswith(e2[1:]) if e2.startswith('*') else f.endswith(e2)):
-                                        self.orphan_map[base]['siblings'].append(os.path.join(folder, f))
-            if not found_any:
-                self.log_line("No orphans found.")
-        finally:
-            self.stop_progress("Orphan scan complete")
+
+        def work(ctx):
+            orphan_map = {}
+            for base, missing, orphans, siblings in self.engine.iter_orphans(ctx, roots, exts):
+                ctx.log(f"Orphan: {base} in {os.path.dirname(orphans[0])} missing {sorted(missing)}")
+                # The same base name can be an orphan in more than one base folder
+                orphan_map.setdefault(base, {'orphan': [], 'siblings': siblings})['orphan'].extend(orphans)
+            if not orphan_map:
+                ctx.log("No orphans found.")
+            return orphan_map
+
+        def done(orphan_map):
+            self.orphan_map = orphan_map
+
+        self.run_task("Scanning for orphans…", work, done, "Orphan scan complete")
 
     def move_orphans_to_sibling(self):
         # Move each orphan file to the folder of its sibling (if found)
         if not self.orphan_map:
             messagebox.showinfo("Move Orphans", "No orphan mapping found. Run Orphan Finder first.")
             return
-        self.start_progress("Moving orphans…")
-        batch_moves = []
-        try:
-            for base, info in self.orphan_map.items():
-                orphans = info['orphan']
-                siblings = info['siblings']
-                if not siblings or not orphans:
-                    continue
-                # Move each orphan to the folder of the first sibling found
-                target_folder = os.path.dirname(os.path.normpath(siblings[0]))
-                for orphan_file in orphans:
-                    orphan_file = os.path.normpath(orphan_file)
-                    orphan_basename = os.path.basename(orphan_file)
-                    dest_path = os.path.join(target_folder, orphan_basename)
-                    dest_path = os.path.normpath(dest_path)
-                    if not os.path.exists(orphan_file):
-                        self.log_line(f"Skipped (not found): {orphan_file}")
-                        continue
-                    if os.path.abspath(orphan_file) == os.path.abspath(dest_path):
-                        self.log_line(f"Skipped {orphan_basename} (already in {target_folder})")
-                        continue
-                    if os.path.exists(dest_path):
-                        new_dest = self._resolve_conflict(dest_path)
-                        if new_dest is None:
-                            self.log_line(f"Skipped {orphan_basename} (exists in {target_folder})")
-                            continue
-                        else:
-                            dest_path = new_dest
-                    try:
-                        shutil.move(orphan_file, dest_path)
-                        self.log_line(f"Moved orphan {orphan_basename} → {target_folder}")
-                        batch_moves.append((dest_path, orphan_file))
-                    except Exception as e:
-                        self.log_line(f"Error moving {orphan_basename}: {e}")
-        finally:
-            self.stop_progress("Orphan move complete")
-        if batch_moves:
-            self.history.append(batch_moves)
-            self.redo_stack.clear()
-            self.log_line("--- Orphan file moving complete ---")
-        else:
-            self.log_line("No orphan files moved.")
+
+        items = list(self.orphan_map.items())
+        mode = self.conflict_mode.get()
+
+        def done(batch_moves):
+            self._record_batch(batch_moves, "--- Orphan file moving complete ---", "No orphan files moved.")
+
+        self.run_task("Moving orphans…", lambda ctx: self.engine.move_orphans(ctx, items, mode), done, "Orphan move complete")
 
     def duplicate_detector(self):
-        base_dir = self.base_dir if self.base_dir else self.pick_base_dir()
-        if not base_dir:
+        roots = self.base_roots()
+        if not roots:
             return
         self.log_line("--- Duplicate Detector ---")
-        self.start_progress("Scanning for duplicates…")
-        try:
-            locations = defaultdict(set)
-            for root, _, files in os.walk(base_dir):
-                for f in files:
-                    base, _ = os.path.splitext(f)
-                    locations[base].add(root)
-            dups = {b: dirs for b, dirs in locations.items() if len(dirs) > 1}
-            if not dups:
-                self.log_line("No duplicates found across subfolders.")
+
+        def work(ctx):
+            found = False
+            for b, dirs in self.engine.iter_duplicates(ctx, roots):
+                found = True
+                ctx.log(f"Duplicate base '{b}' found in:")
+                for d in dirs:
+                    ctx.log(f"  - {d}")
+            if not found:
+                ctx.log("No duplicates found across subfolders.")
+
+        self.run_task("Scanning for duplicates…", work, lambda _: None, "Duplicate scan complete")
+
+    def identical_detector(self):
+        # Same content under any name; only files matching the extensions list are compared
+        roots = self.base_roots()
+        if not roots:
+            return
+        exts = self.parse_extensions()
+        self.log_line("--- Identical Files ---")
+
+        def work(ctx):
+            groups = self.engine.find_identical(ctx, roots, exts)
+            wasted = 0
+            for digest, size, paths in groups:
+                wasted += size * (len(paths) - 1)
+                ctx.log(f"Identical content ({size / 1e6:.1f} MB, sha256 {digest[:12]}…):")
+                for p in paths:
+                    ctx.log(f"  - {p}")
+            if groups:
+                ctx.log(f"{len(groups)} group(s) of identical files, {wasted / 1e9:.2f} GB in extra copies.")
             else:
-                for b, dirs in dups.items():
-                    self.log_line(f"Duplicate base '{b}' found in:")
-                    for d in sorted(dirs):
-                        self.log_line(f"  - {d}")
-        finally:
-            self.stop_progress("Duplicate scan complete")
+                ctx.log("No identical files found.")
+
+        self.run_task("Hashing files…", work, lambda _: None, "Identical file scan complete")
+
+    # ------------------------------ Watch mode ------------------------------
+    def toggle_watch(self):
+        if self.watch_var.get():
+            self.start_watch()
+        else:
+            self.stop_watch()
+            self.log_line("Watch mode stopped.")
+
+    def start_watch(self):
+        # Subscribe first, then bring the index up to date: changes made while indexing are
+        # queued and applied afterwards, so nothing falls between the two
+        roots = self.base_roots()
+        if not roots or self.worker.busy:
+            if self.worker.busy:
+                self.log_line("Another operation is still running.")
+            self.watch_var.set(False)
+            return
+        self.watcher = make_watcher(roots).start()
+
+        def work(ctx):
+            return self.engine.ensure_index(ctx, roots, refresh=True)
+
+        def done(index):
+            if self.watcher is not None:
+                self.log_line(f"Watching {', '.join(index.roots)} for changes ({self.watcher.kind}).")
+
+        self.run_task("Indexing base folder…", work, done, "Watching")
+        self._watch_after = self.root.after(WATCH_POLL_MS, self._poll_watch)
+
+    def stop_watch(self):
+        # Cancels the poll timer too, so turning watch mode back on can't leave two poll loops
+        if self._watch_after is not None:
+            self.root.after_cancel(self._watch_after)
+            self._watch_after = None
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.watch_var.set(False)
+
+    def _poll_watch(self):
+        self._watch_after = None
+        if self.watcher is None:
+            return
+        if not self.worker.busy:
+            # Scans and moves read the index on the worker thread; changes wait until they finish
+            events = self.watcher.drain()
+            if events:
+                self._apply_watch_events(events)
+        if self.watcher is not None:
+            self._watch_after = self.root.after(WATCH_POLL_MS, self._poll_watch)
+
+    def _apply_watch_events(self, events):
+        for kind, message in events:
+            if kind == "error":
+                self.stop_watch()
+                self.log_line(f"Watch mode stopped: {message}")
+                return
+        if self.engine.index is None:
+            return
+        touched = self.engine.apply_changes(events)
+        if touched is None:
+            self.log_line("Watch: some changes were missed, re-indexing…")
+            self.refresh_index()
+            return
+        added = [path for kind, path in events if kind == "add"]
+        removed = sum(1 for kind, _ in events if kind != "add")
+        self.log_line(f"Watch: {len(added)} file(s) added, {removed} removed.")
+        index = self.engine.index
+
+        # New files in a base folder itself are the usual downloads waiting to be sorted
+        for path in added:
+            if os.path.dirname(os.path.abspath(path)) in index.roots and os.path.exists(path):
+                folders = sorted({os.path.dirname(p) for p in index.siblings(path)})
+                if folders:
+                    self.log_line(f"New file {os.path.basename(path)}: siblings in {', '.join(folders)}")
+
+        # Sibling targets of the selected reference files whose base name changed (model ID
+        # targets need the sidecars re-read, so those wait for the next preview)
+        changed = False
+        for ref_file in self.reference_files if self.route_var.get() == "name" else ():
+            if index.key(os.path.basename(ref_file)) not in touched:
+                continue
+            sibling_files = index.siblings(ref_file)
+            if sibling_files:
+                changed = changed or self.preview_results.get(ref_file) != sibling_files
+                self.preview_results[ref_file] = sibling_files
+            elif self.preview_results.pop(ref_file, None) is not None:
+                changed = True
+        if changed:
+            self.update_preview_list()
+
+        # Orphan status of the touched base names
+        exts = self.parse_extensions()
+        if exts:
+            for base in touched:
+                self.orphan_map.pop(base, None)
+            # engine.metrics is the last task's report, already in metrics_history: count elsewhere
+            task_metrics, self.engine.metrics = self.engine.metrics, Metrics()
+            try:
+                for base, missing, orphans, siblings in self.engine.iter_orphans(NullContext(), index.roots, exts,
+                                                                                 touched):
+                    self.log_line(f"Orphan: {base} in {os.path.dirname(orphans[0])} missing {sorted(missing)}")
+                    self.orphan_map.setdefault(base, {'orphan': [], 'siblings': siblings})['orphan'].extend(orphans)
+            finally:
+                self.engine.metrics = task_metrics
 
     def export_log(self):
-        content = self.log.get("1.0", tk.END)
-        dbg_content = self.debug_log.get("1.0", tk.END)
-        if not content.strip() and not dbg_content.strip():
+        if self.log_sink.empty and self.debug_sink.empty:
             messagebox.showinfo("Export Log", "Log is empty.")
             return
         path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt")])
@@ -573,10 +1045,14 @@ class LoRASorterApp:
         try:
             with open(path, 'w', encoding='utf-8') as f:
                 f.write("=== Main Log ===\n")
-                f.write(content)
+                f.write(self.log_sink.history())
                 f.write("\n\n=== Debug Log ===\n")
-                f.write(dbg_content)
+                f.write(self.debug_sink.history())
             self.log_line(f"Log exported to: {path}")
+            if self.metrics_history:
+                metrics_path = os.path.splitext(path)[0] + ".metrics.json"
+                write_metrics(metrics_path, self.metrics_history)
+                self.log_line(f"Metrics exported to: {metrics_path}")
         except Exception as e:
             messagebox.showerror("Export Log", f"Failed to save log: {e}")
 